@@ -1,11 +1,23 @@
 import abc
+import itertools
 import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Tuple
-from .models import UTXOModel, TransactionModel, BlockModel
+from .models import UTXOModel, TransactionModel, BlockModel, TransactionInput, TransactionOutput
 try:
     from google.cloud import firestore
+    from google.api_core.exceptions import Aborted
 except ImportError:
     firestore = None
+    Aborted = None
+
+# Number of most recent blocks returned by get_blockchain()
+BLOCKCHAIN_WINDOW = 20
+
+def utxo_key(tx_id: str, index: int) -> str:
+    # One string to hash instead of a tuple; also the Firestore document id
+    return f"{tx_id}:{index}"
 
 class Database(abc.ABC):
     @abc.abstractmethod
@@ -16,10 +28,18 @@ class Database(abc.ABC):
     def get_utxo(self, tx_id: str, index: int) -> Optional[UTXOModel]:
         pass
 
+    @abc.abstractmethod
+    def multi_get_utxos(self, keys: List[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[UTXOModel]]:
+        pass
+
     @abc.abstractmethod
     def add_utxo(self, utxo: UTXOModel):
         pass
 
+    @abc.abstractmethod
+    def get_balance(self, owner: str) -> float:
+        pass
+
     @abc.abstractmethod
     def remove_utxo(self, tx_id: str, index: int):
         pass
@@ -36,6 +56,11 @@ class Database(abc.ABC):
     def remove_from_mempool(self, tx_id: str):
         pass
 
+    @abc.abstractmethod
+    def get_spent_index(self) -> Dict[Tuple[str, int], str]:
+        # (prev_tx, index) -> tx_id of the mempool transaction spending it
+        pass
+
     @abc.abstractmethod
     def get_blockchain(self) -> List[BlockModel]:
         pass
@@ -43,6 +68,12 @@ class Database(abc.ABC):
     @abc.abstractmethod
     def add_block(self, block: BlockModel):
         pass
+
+    @abc.abstractmethod
+    def commit_block(self, block: BlockModel, spent: List[Tuple[str, int]], created: List[UTXOModel]):
+        # Apply a mined block: remove spent UTXOs, add created ones, drop the
+        # block's transactions from the mempool and append the block
+        pass
     
     @abc.abstractmethod
     def reset_system(self, genesis_utxos: List[UTXOModel]):
@@ -50,115 +81,238 @@ class Database(abc.ABC):
 
 class InMemoryDatabase(Database):
     def __init__(self):
-        self.utxos: Dict[Tuple[str, int], UTXOModel] = {}
-        self.mempool: List[TransactionModel] = []
+        self.utxos: Dict[str, UTXOModel] = {}
+        # Secondary index so owner lookups don't scan the whole UTXO set.
+        # Inner dicts are used as insertion-ordered sets to keep coin selection stable.
+        self.by_owner: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # Running per-owner totals, updated alongside by_owner
+        self.balances: Dict[str, float] = defaultdict(float)
+        self.mempool: Dict[str, TransactionModel] = {}
+        # Maintained incrementally so conflict checks don't rescan the mempool
+        self.spent_index: Dict[Tuple[str, int], str] = {}
         self.chain: List[BlockModel] = []
+        self.chain_window = deque(maxlen=BLOCKCHAIN_WINDOW)
         print("Initialized InMemoryDatabase")
 
     def get_utxos(self, owner: str = None) -> List[UTXOModel]:
         if owner:
-            return [u for u in self.utxos.values() if u.owner == owner]
+            return [self.utxos[k] for k in self.by_owner.get(owner, ())]
         return list(self.utxos.values())
 
     def get_utxo(self, tx_id: str, index: int) -> Optional[UTXOModel]:
-        return self.utxos.get((tx_id, index))
+        return self.utxos.get(utxo_key(tx_id, index))
+
+    def multi_get_utxos(self, keys: List[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[UTXOModel]]:
+        return {k: self.utxos.get(utxo_key(*k)) for k in keys}
 
     def add_utxo(self, utxo: UTXOModel):
-        self.utxos[(utxo.tx_id, utxo.index)] = utxo
+        key = utxo_key(utxo.tx_id, utxo.index)
+        if key in self.utxos:
+            self.remove_utxo(utxo.tx_id, utxo.index)
+        self.utxos[key] = utxo
+        self.by_owner[utxo.owner][key] = None
+        self.balances[utxo.owner] += utxo.amount
 
     def remove_utxo(self, tx_id: str, index: int):
-        if (tx_id, index) in self.utxos:
-            del self.utxos[(tx_id, index)]
+        key = utxo_key(tx_id, index)
+        utxo = self.utxos.pop(key, None)
+        if utxo is None:
+            return
+        keys = self.by_owner[utxo.owner]
+        keys.pop(key, None)
+        if keys:
+            self.balances[utxo.owner] -= utxo.amount
+        else:
+            # Drop the entry outright so float residue can't leave a non-zero balance
+            del self.by_owner[utxo.owner]
+            del self.balances[utxo.owner]
+
+    def get_balance(self, owner: str) -> float:
+        return self.balances.get(owner, 0.0)
 
     def get_mempool(self) -> List[TransactionModel]:
-        return self.mempool
+        return list(self.mempool.values())
 
     def add_to_mempool(self, tx: TransactionModel):
-        self.mempool.append(tx)
+        self.mempool[tx.tx_id] = tx
+        for inp in tx.inputs:
+            self.spent_index[(inp.prev_tx, inp.index)] = tx.tx_id
 
     def remove_from_mempool(self, tx_id: str):
-        self.mempool = [tx for tx in self.mempool if tx.tx_id != tx_id]
+        tx = self.mempool.pop(tx_id, None)
+        if tx is None:
+            return
+        for inp in tx.inputs:
+            self.spent_index.pop((inp.prev_tx, inp.index), None)
+
+    def get_spent_index(self) -> Dict[Tuple[str, int], str]:
+        return self.spent_index
 
     def get_blockchain(self) -> List[BlockModel]:
-        # Return last 20 blocks, newest first
-        return self.chain[::-1][:20]
+        # Return last BLOCKCHAIN_WINDOW blocks, newest first
+        return list(reversed(self.chain_window))
 
     def add_block(self, block: BlockModel):
         self.chain.append(block)
+        self.chain_window.append(block)
+
+    def commit_block(self, block: BlockModel, spent: List[Tuple[str, int]], created: List[UTXOModel]):
+        for tx_id, index in spent:
+            self.remove_utxo(tx_id, index)
+        for utxo in created:
+            self.add_utxo(utxo)
+        for tx in block.transactions:
+            self.remove_from_mempool(tx.tx_id)
+        self.add_block(block)
 
     def reset_system(self, genesis_utxos: List[UTXOModel]):
         self.utxos.clear()
+        self.by_owner.clear()
+        self.balances.clear()
         self.mempool.clear()
+        self.spent_index.clear()
         self.chain.clear()
+        self.chain_window.clear()
         for utxo in genesis_utxos:
             self.add_utxo(utxo)
 
+# Documents are only ever written from validated models (as_dict), so reads
+# skip pydantic validation. model_construct doesn't recurse into nested
+# models, hence the explicit construction of inputs, outputs and transactions.
+def _tx_from_doc(data: dict) -> TransactionModel:
+    data['inputs'] = [TransactionInput.model_construct(**inp) for inp in data['inputs']]
+    data['outputs'] = [TransactionOutput.model_construct(**out) for out in data['outputs']]
+    return TransactionModel.model_construct(**data)
+
+def _block_from_doc(data: dict) -> BlockModel:
+    data['transactions'] = [_tx_from_doc(tx) for tx in data['transactions']]
+    return BlockModel.model_construct(**data)
+
 class FirestoreDatabase(Database):
+    # Firestore caps a batch at 500 writes; leave some headroom
+    BATCH_SIZE = 450
+    COMMIT_WORKERS = 10
+    COMMIT_RETRIES = 3
+    CLIENT_POOL_SIZE = 4
+
     def __init__(self, project_id: str = None):
-        self.db = firestore.Client(project=project_id)
-        print(f"Initialized FirestoreDatabase with project {self.db.project}")
+        # Clients are created once per process (init_db) and shared by all
+        # requests; collection calls are spread round-robin across the pool.
+        self.clients = [firestore.Client(project=project_id) for _ in range(self.CLIENT_POOL_SIZE)]
+        self._rr = itertools.cycle(self.clients)
+        self.db = self.clients[0]
+        print(f"Initialized FirestoreDatabase with project {self.db.project} ({len(self.clients)} clients)")
+
+    def _collection(self, name: str):
+        return next(self._rr).collection(name)
 
     def get_utxos(self, owner: str = None) -> List[UTXOModel]:
-        query = self.db.collection('utxos')
+        query = self._collection('utxos')
         if owner:
             query = query.where('owner', '==', owner)
         docs = query.stream()
-        return [UTXOModel(**doc.to_dict()) for doc in docs]
+        return [UTXOModel.model_construct(**doc.to_dict()) for doc in docs]
 
     def get_utxo(self, tx_id: str, index: int) -> Optional[UTXOModel]:
-        # Helper ID format: tx_id:index
-        doc_id = f"{tx_id}:{index}"
-        doc = self.db.collection('utxos').document(doc_id).get()
+        doc_id = utxo_key(tx_id, index)
+        doc = self._collection('utxos').document(doc_id).get()
         if doc.exists:
-            return UTXOModel(**doc.to_dict())
+            return UTXOModel.model_construct(**doc.to_dict())
         return None
 
+    def multi_get_utxos(self, keys: List[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[UTXOModel]]:
+        # One batched get_all round trip instead of a get() per outpoint
+        client = next(self._rr)
+        refs = [client.collection('utxos').document(utxo_key(*k)) for k in keys]
+        found = {doc.id: UTXOModel.model_construct(**doc.to_dict()) for doc in client.get_all(refs) if doc.exists}
+        return {k: found.get(utxo_key(*k)) for k in keys}
+
     def add_utxo(self, utxo: UTXOModel):
-        doc_id = f"{utxo.tx_id}:{utxo.index}"
-        self.db.collection('utxos').document(doc_id).set(utxo.dict())
+        doc_id = utxo_key(utxo.tx_id, utxo.index)
+        self._collection('utxos').document(doc_id).set(utxo.as_dict)
 
     def remove_utxo(self, tx_id: str, index: int):
-        doc_id = f"{tx_id}:{index}"
-        self.db.collection('utxos').document(doc_id).delete()
+        doc_id = utxo_key(tx_id, index)
+        self._collection('utxos').document(doc_id).delete()
+
+    def get_balance(self, owner: str) -> float:
+        # Sum server-side instead of streaming and hydrating every UTXO document
+        result = self._collection('utxos').where('owner', '==', owner).sum('amount', alias='balance').get()
+        return float(result[0][0].value) if result else 0.0
 
     def get_mempool(self) -> List[TransactionModel]:
-        docs = self.db.collection('mempool').stream()
-        return [TransactionModel(**doc.to_dict()) for doc in docs]
+        docs = self._collection('mempool').stream()
+        return [_tx_from_doc(doc.to_dict()) for doc in docs]
 
     def add_to_mempool(self, tx: TransactionModel):
-        self.db.collection('mempool').document(tx.tx_id).set(tx.dict())
+        self._collection('mempool').document(tx.tx_id).set(tx.as_dict)
 
     def remove_from_mempool(self, tx_id: str):
-        self.db.collection('mempool').document(tx_id).delete()
+        self._collection('mempool').document(tx_id).delete()
+
+    def get_spent_index(self) -> Dict[Tuple[str, int], str]:
+        # No server-side index; derive it from a single mempool read
+        return {
+            (inp.prev_tx, inp.index): tx.tx_id
+            for tx in self.get_mempool()
+            for inp in tx.inputs
+        }
 
     def get_blockchain(self) -> List[BlockModel]:
-        # Limit to last 20 blocks to prevent huge reads
-        docs = self.db.collection('blocks').order_by('block_number', direction=firestore.Query.DESCENDING).limit(20).stream()
-        return [BlockModel(**doc.to_dict()) for doc in docs]
+        # Limit to last BLOCKCHAIN_WINDOW blocks to prevent huge reads
+        docs = self._collection('blocks').order_by('block_number', direction=firestore.Query.DESCENDING).limit(BLOCKCHAIN_WINDOW).stream()
+        return [_block_from_doc(doc.to_dict()) for doc in docs]
 
     def add_block(self, block: BlockModel):
-        self.db.collection('blocks').document(str(block.block_number)).set(block.dict())
+        self._collection('blocks').document(str(block.block_number)).set(block.as_dict)
+
+    def commit_block(self, block: BlockModel, spent: List[Tuple[str, int]], created: List[UTXOModel]):
+        # One batch: a single round trip, and the block lands atomically.
+        # Assumes the block stays under Firestore's 500-write batch limit,
+        # which holds for the simulator's block sizes.
+        batch = self.db.batch()
+        utxos = self._collection('utxos')
+        mempool = self._collection('mempool')
+        for tx_id, index in spent:
+            batch.delete(utxos.document(utxo_key(tx_id, index)))
+        for utxo in created:
+            batch.set(utxos.document(utxo_key(utxo.tx_id, utxo.index)), utxo.as_dict)
+        for tx in block.transactions:
+            batch.delete(mempool.document(tx.tx_id))
+        batch.set(self._collection('blocks').document(str(block.block_number)), block.as_dict)
+        self._commit_with_retry(batch)
+
+    def _commit_with_retry(self, batch):
+        for attempt in range(self.COMMIT_RETRIES):
+            try:
+                return batch.commit()
+            except Aborted:
+                if attempt == self.COMMIT_RETRIES - 1:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _delete_collections(self, names: List[str]):
+        # select([]) streams existing documents without their fields; batches
+        # are submitted as soon as they fill, so commits overlap the reads and
+        # the full id list never has to be held in memory
+        with ThreadPoolExecutor(max_workers=self.COMMIT_WORKERS) as pool:
+            futures = []
+            batch, pending = self.db.batch(), 0
+            for name in names:
+                for doc in self._collection(name).select([]).stream():
+                    batch.delete(doc.reference)
+                    pending += 1
+                    if pending == self.BATCH_SIZE:
+                        futures.append(pool.submit(self._commit_with_retry, batch))
+                        batch, pending = self.db.batch(), 0
+            if pending:
+                futures.append(pool.submit(self._commit_with_retry, batch))
+            for future in futures:
+                future.result()
 
     def reset_system(self, genesis_utxos: List[UTXOModel]):
         # This is expensive in Firestore, but okay for Admin tool
-        # Batch delete
-        batch = self.db.batch()
-        
-        # Delete UTXOs
-        for doc in self.db.collection('utxos').list_documents():
-            batch.delete(doc)
-            
-        # Delete Mempool
-        for doc in self.db.collection('mempool').list_documents():
-            batch.delete(doc)
-
-        # Delete Operations
-        batch.commit()
-        
-        # Delete Blocks (separate batch to avoid limits, although basic impl here)
-        blocks = self.db.collection('blocks').list_documents()
-        for doc in blocks:
-            doc.delete()
+        self._delete_collections(['utxos', 'mempool', 'blocks'])
 
         # Add Genesis
         for utxo in genesis_utxos:
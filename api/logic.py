@@ -1,5 +1,6 @@
+import heapq
+import secrets
 import time
-import random
 from typing import List, Tuple, Optional
 from .models import TransactionModel, BlockModel, UTXOModel, TransactionInput, TransactionOutput
 from .database import Database
@@ -9,8 +10,7 @@ class BitcoinService:
         self.db = db
 
     def get_balance(self, address: str) -> float:
-        utxos = self.db.get_utxos(owner=address)
-        return sum(u.amount for u in utxos)
+        return self.db.get_balance(address)
 
     def validate_transaction(self, tx: TransactionModel) -> Tuple[bool, str]:
         # 1. No negative outputs
@@ -18,39 +18,37 @@ class BitcoinService:
             if output.amount < 0:
                 return False, f"Invalid: Negative output amount {output.amount}"
 
-        # 2. No double spending in inputs (same UTXO twice in same tx)
-        seen_inputs = set()
-        for inp in tx.inputs:
-            input_key = (inp.prev_tx, inp.index)
-            if input_key in seen_inputs:
-                return False, f"Invalid: Double-spend in same transaction - UTXO {input_key} used twice"
-            seen_inputs.add(input_key)
+        # 2. No double spending in inputs (same UTXO twice in same tx).
+        # A single-input tx (the common case) has nothing to compare.
+        keys = [(inp.prev_tx, inp.index) for inp in tx.inputs]
+        if len(keys) > 1:
+            seen_inputs = set()
+            for input_key in keys:
+                if input_key in seen_inputs:
+                    return False, f"Invalid: Double-spend in same transaction - UTXO {input_key} used twice"
+                seen_inputs.add(input_key)
 
         # 3. All inputs must exist in UTXO set AND belong to owner
+        # 4. No conflict with mempool (UTXO not already spent in unconfirmed tx)
+        # Both are checked in one pass over the inputs. The spent index maps each
+        # outpoint to its spender, so a tx already in the mempool doesn't
+        # conflict with itself.
+        utxos = self.db.multi_get_utxos(keys)
+        spent_index = self.db.get_spent_index()
         total_input = 0.0
-        for inp in tx.inputs:
-            utxo = self.db.get_utxo(inp.prev_tx, inp.index)
+        for inp, input_key in zip(tx.inputs, keys):
+            utxo = utxos[input_key]
             if not utxo:
                 return False, f"Invalid: Input UTXO ({inp.prev_tx}, {inp.index}) does not exist"
             
             if utxo.owner != inp.owner:
                 return False, f"Invalid: UTXO owner mismatch. Expected {utxo.owner}, got {inp.owner}"
-            
-            total_input += utxo.amount
 
-        # 4. No conflict with mempool (UTXO not already spent in unconfirmed tx)
-        # Note: This is O(N*M) where N=mempool size, M=inputs. Could be optimized.
-        mempool = self.db.get_mempool()
-        spent_in_mempool = set()
-        for m_tx in mempool:
-            if m_tx.tx_id == tx.tx_id:
-                continue # Skip self if already in there (shouldn't happen for new tx validation)
-            for m_inp in m_tx.inputs:
-                spent_in_mempool.add((m_inp.prev_tx, m_inp.index))
-
-        for inp in tx.inputs:
-            if (inp.prev_tx, inp.index) in spent_in_mempool:
+            spender = spent_index.get(input_key)
+            if spender is not None and spender != tx.tx_id:
                 return False, f"Invalid: UTXO ({inp.prev_tx}, {inp.index}) already spent by transaction in mempool"
+            
+            total_input += utxo.amount
 
         # 5. Input >= Output
         total_output = sum(out.amount for out in tx.outputs)
@@ -64,11 +62,7 @@ class BitcoinService:
         utxos = self.db.get_utxos(sender)
         
         # Check tracking in mempool to avoid double spending *own* pending UTXOs
-        mempool = self.db.get_mempool()
-        spent_in_mempool = set()
-        for m_tx in mempool:
-            for m_inp in m_tx.inputs:
-                spent_in_mempool.add((m_inp.prev_tx, m_inp.index))
+        spent_in_mempool = self.db.get_spent_index()
         
         # Filter available UTXOs
         available_utxos = [u for u in utxos if (u.tx_id, u.index) not in spent_in_mempool]
@@ -88,9 +82,8 @@ class BitcoinService:
             return None, f"Insufficient funds. Have {total_selected}, need {needed}"
 
         # Construct TX
-        timestamp = int(time.time() * 1000)
-        random_suffix = random.randint(1000, 9999)
-        tx_id = f"tx_{timestamp}_{random_suffix}"
+        timestamp = time.time_ns() // 1_000_000
+        tx_id = f"tx_{timestamp}_{secrets.token_hex(2)}"
 
         inputs = [TransactionInput(prev_tx=u.tx_id, index=u.index, owner=sender) for u in selected]
         outputs = [TransactionOutput(amount=amount, address=recipient)]
@@ -99,12 +92,14 @@ class BitcoinService:
         if change > 0:
             outputs.append(TransactionOutput(amount=change, address=sender))
 
+        # Models are frozen, so the fee is cached at construction
         tx = TransactionModel(
             tx_id=tx_id,
             inputs=inputs,
             outputs=outputs,
             timestamp=timestamp,
-            status="pending"
+            status="pending",
+            fee=total_selected - sum(o.amount for o in outputs)
         )
         
         # Validate again just to be safe (redundant but good)
@@ -120,46 +115,64 @@ class BitcoinService:
         if not mempool:
             return None, "No transactions in mempool"
 
-        # Sort by fee
-        # Fee calculation requires looking up UTXOs. 
-        # For simplicity/speed, we'll calculate fees for all and sort.
-        tx_fees = []
-        valid_txs = []
-        
-        for tx in mempool:
-            # Re-validate (UTXOs might have been spent by another block race condition)
-            # In a real system, we'd do this carefully. 
-            # With Firestore, we might want to do this inside a transaction, but here we do best effort.
-            valid, _ = self.validate_transaction(tx)
-            if not valid:
-                # Invalid tx in mempool (maybe double spent?), remove it
+        # Highest fee first. Fees are cached at admission; anything admitted
+        # before that gets its fee worked out during selection.
+        # A heap costs O(N) to build and O(log N) per candidate popped, so
+        # filling a small block doesn't pay for sorting the whole mempool.
+        # The position breaks fee ties in arrival order.
+        candidates = [(-(tx.fee or 0.0), pos, tx) for pos, tx in enumerate(mempool)]
+        heapq.heapify(candidates)
+
+        # Phase 1: select against a local view of the UTXO set instead of
+        # re-validating each tx against the db. Every input is fetched at most
+        # once, and accepted txs update the view (inputs spent, outputs created)
+        # so later candidates see their effect. Spent entries are set to None.
+        # The net effect on the db is collected as we go: spent_keys are inputs
+        # that existed before this block, created holds outputs that survive it.
+        local_utxos = {}
+        spent_keys = []
+        created = {}
+        selected_txs = []
+        total_fees = 0.0
+
+        while candidates and len(selected_txs) < num_txs:
+            _, _, tx = heapq.heappop(candidates)
+
+            keys = [(inp.prev_tx, inp.index) for inp in tx.inputs]
+            unseen = [key for key in keys if key not in local_utxos]
+            if unseen:
+                local_utxos.update(self.db.multi_get_utxos(unseen))
+
+            if not all(local_utxos[key] is not None for key in keys):
+                # Inputs already spent (e.g. by a concurrent block), drop it
                 self.db.remove_from_mempool(tx.tx_id)
                 continue
-            
-            # Calculate fee
-            inputs_val = 0.0
-            for inp in tx.inputs:
-                u = self.db.get_utxo(inp.prev_tx, inp.index)
-                if u: inputs_val += u.amount
-            outputs_val = sum(o.amount for o in tx.outputs)
-            fee = inputs_val - outputs_val
-            tx_fees.append((tx, fee))
-
-        tx_fees.sort(key=lambda x: x[1], reverse=True)
-        selected = tx_fees[:num_txs]
-        
-        if not selected:
-             return None, "No valid transactions to mine"
 
-        selected_txs = [t[0] for t in selected]
-        total_fees = sum(t[1] for t in selected)
+            fee = tx.fee
+            if fee is None:
+                fee = sum(local_utxos[key].amount for key in keys) - sum(o.amount for o in tx.outputs)
+
+            for key in keys:
+                local_utxos[key] = None
+                if created.pop(key, None) is None:
+                    spent_keys.append(key)
+            for idx, out in enumerate(tx.outputs):
+                utxo = UTXOModel(tx_id=tx.tx_id, index=idx, amount=out.amount, owner=out.address)
+                local_utxos[(tx.tx_id, idx)] = utxo
+                created[(tx.tx_id, idx)] = utxo
+
+            selected_txs.append(tx)
+            total_fees += fee
+
+        if not selected_txs:
+             return None, "No valid transactions to mine"
 
         # Create Block
         chain = self.db.get_blockchain()
         prev_hash = chain[-1].hash if chain else "genesis"
         block_num = len(chain) + 1
         
-        timestamp = int(time.time() * 1000)
+        timestamp = time.time_ns() // 1_000_000
         
         # Create Coinbase
         coinbase_tx = TransactionModel(
@@ -183,23 +196,10 @@ class BitcoinService:
             hash=f"block_{block_num}_{miner_address}_{len(final_txs)}_{timestamp}" # simplified hash
         )
 
-        # Commit changes
-        # 1. Remove inputs from UTXO
-        # 2. Add outputs to UTXO
-        # 3. Remove from mempool
-        # 4. Add block
-        
-        for tx in selected_txs:
-            for inp in tx.inputs:
-                self.db.remove_utxo(inp.prev_tx, inp.index)
-            for idx, out in enumerate(tx.outputs):
-                self.db.add_utxo(UTXOModel(tx_id=tx.tx_id, index=idx, amount=out.amount, owner=out.address))
-            self.db.remove_from_mempool(tx.tx_id)
-            
-        # Add coinbase UTXO
-        self.db.add_utxo(UTXOModel(tx_id=coinbase_tx.tx_id, index=0, amount=total_fees, owner=miner_address))
-        
-        self.db.add_block(block)
+        # Phase 2: apply the whole block in one step (UTXO removals and
+        # additions, mempool removals, block append)
+        created[(coinbase_tx.tx_id, 0)] = UTXOModel(tx_id=coinbase_tx.tx_id, index=0, amount=total_fees, owner=miner_address)
+        self.db.commit_block(block, spent_keys, list(created.values()))
         
         return block, f"Mined block {block.block_number} with {total_fees} fees"
         
@@ -1,5 +1,8 @@
+import hashlib
 import os
-from fastapi import FastAPI, HTTPException, Body
+import orjson
+from fastapi import FastAPI, HTTPException, Body, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict
@@ -11,7 +14,8 @@ from .models import (
 from .database import init_db, get_db
 from .logic import BitcoinService
 
-app = FastAPI(title="Bitcoin UTXO Simulator API")
+# orjson serializes the large UTXO/mempool/chain lists much faster than json.dumps
+app = FastAPI(title="Bitcoin UTXO Simulator API", default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -22,9 +26,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Polled by the dashboard; these set their own ETag headers so unchanged
+# data is revalidated with a 304 instead of being re-downloaded
+ETAG_PATHS = {"/api/blockchain", "/api/mempool"}
+
 @app.middleware("http")
 async def add_no_cache_header(request, call_next):
     response = await call_next(request)
+    if request.url.path in ETAG_PATHS:
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
@@ -38,19 +48,30 @@ init_db(use_firestore)
 def get_service():
     return BitcoinService(get_db())
 
+def etag_response(request: Request, payload: list) -> Response:
+    body = orjson.dumps(payload)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Routes
 @app.get("/api/balance/{address}")
 def get_balance(address: str):
     service = get_service()
     return {"address": address, "balance": service.get_balance(address)}
 
-@app.get("/api/utxos/{address}", response_model=List[UTXOModel])
+# The list endpoints below skip response_model validation: their data comes
+# from the db layer as already-validated models, so re-validating every item
+# is pure overhead. `responses=` keeps the schema in the OpenAPI docs.
+@app.get("/api/utxos/{address}", responses={200: {"model": List[UTXOModel]}})
 def get_utxos(address: str):
-    return get_db().get_utxos(address)
+    return ORJSONResponse([u.as_dict for u in get_db().get_utxos(address)])
 
-@app.get("/api/mempool", response_model=List[TransactionModel])
-def get_mempool():
-    return get_db().get_mempool()
+@app.get("/api/mempool", responses={200: {"model": List[TransactionModel]}})
+def get_mempool(request: Request):
+    return etag_response(request, [tx.as_dict for tx in get_db().get_mempool()])
 
 @app.post("/api/transaction")
 def create_transaction(req: CreateTransactionRequest):
@@ -68,9 +89,9 @@ def mine_block(req: MineBlockRequest):
         raise HTTPException(status_code=400, detail=msg)
     return {"status": "success", "message": msg, "block": block}
 
-@app.get("/api/blockchain", response_model=List[BlockModel])
-def get_blockchain():
-    return get_db().get_blockchain()
+@app.get("/api/blockchain", responses={200: {"model": List[BlockModel]}})
+def get_blockchain(request: Request):
+    return etag_response(request, [block.as_dict for block in get_db().get_blockchain()])
 
 @app.post("/api/admin/genesis")
 def init_genesis(req: GenesisRequest):
@@ -1,23 +1,35 @@
-from pydantic import BaseModel, Field
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 
-class TransactionInput(BaseModel):
+class FrozenModel(BaseModel):
+    # Immutable after construction, which makes caching the serialized form safe.
+    # Build a new instance instead of model_copy(update=...), which would carry
+    # the stale cache over.
+    model_config = ConfigDict(frozen=True)
+
+    @cached_property
+    def as_dict(self) -> Dict[str, Any]:
+        return self.model_dump()
+
+class TransactionInput(FrozenModel):
     prev_tx: str
     index: int
     owner: str
 
-class TransactionOutput(BaseModel):
+class TransactionOutput(FrozenModel):
     amount: float
     address: str
 
-class TransactionModel(BaseModel):
+class TransactionModel(FrozenModel):
     tx_id: str
     inputs: List[TransactionInput]
     outputs: List[TransactionOutput]
     timestamp: Optional[int] = None
     status: str = "pending"  # pending, confirmed
+    fee: Optional[float] = None  # fixed at creation; inputs never change
 
-class BlockModel(BaseModel):
+class BlockModel(FrozenModel):
     block_number: int
     previous_hash: str
     miner: str
@@ -26,21 +38,21 @@ class BlockModel(BaseModel):
     timestamp: int
     hash: str
 
-class UTXOModel(BaseModel):
+class UTXOModel(FrozenModel):
     tx_id: str
     index: int
     amount: float
     owner: str
 
-class CreateTransactionRequest(BaseModel):
+class CreateTransactionRequest(FrozenModel):
     sender: str
     recipient: str
     amount: float
     fee: float = 0.001
 
-class MineBlockRequest(BaseModel):
+class MineBlockRequest(FrozenModel):
     miner_address: str
     num_txs: int = 5
 
-class GenesisRequest(BaseModel):
+class GenesisRequest(FrozenModel):
     initial_allocations: Dict[str, float]
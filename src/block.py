@@ -3,6 +3,7 @@ Block - Represents a block in the blockchain and mining simulation
 """
 
 from transaction import Transaction
+from units import format_btc
 
 
 class Block:
@@ -23,7 +24,7 @@ class Block:
         self.previous_hash = previous_hash
         self.miner = miner
         self.transactions = []
-        self.total_fees = 0.0
+        self.total_fees = 0  # satoshis
         self.coinbase_tx = None
     
     def add_transaction(self, tx):
@@ -39,7 +40,7 @@ class Block:
         return f"block_{self.block_number}_{self.miner}_{len(self.transactions)}"
     
     def __str__(self):
-        return f"Block #{self.block_number} by {self.miner} ({len(self.transactions)} txs, {self.total_fees:.8f} BTC fees)"
+        return f"Block #{self.block_number} by {self.miner} ({len(self.transactions)} txs, {format_btc(self.total_fees)} BTC fees)"
 
 
 def mine_block(miner_address: str, mempool, utxo_manager, num_txs=5):
@@ -73,25 +74,25 @@ def mine_block(miner_address: str, mempool, utxo_manager, num_txs=5):
     # Create new block
     block = Block(miner=miner_address)
     
-    total_fees = 0.0
+    total_fees = 0
     
     # Step 2: Update UTXO set permanently
     for tx in selected_txs:
-        # Calculate fee before removing inputs
-        fee = tx.calculate_fee(utxo_manager)
+        # Fee was worked out when the tx entered the mempool
+        fee = mempool.get_fee(tx.tx_id)
         total_fees += fee
         
         # Remove input UTXOs (they are now spent)
         for inp in tx.inputs:
-            utxo_manager.remove_utxo(inp["prev_tx"], inp["index"])
+            utxo_manager.remove_utxo(inp.prev_tx, inp.index)
         
         # Add output UTXOs (newly created)
         for index, output in enumerate(tx.outputs):
             utxo_manager.add_utxo(
                 tx.tx_id,
                 index,
-                output["amount"],
-                output["address"]
+                output.amount,
+                output.address
             )
         
         # Add transaction to block
@@ -112,7 +113,7 @@ def mine_block(miner_address: str, mempool, utxo_manager, num_txs=5):
     for tx in selected_txs:
         mempool.remove_transaction(tx.tx_id)
     
-    return block, f"Block mined successfully with {len(selected_txs)} transactions and {total_fees:.8f} BTC in fees"
+    return block, f"Block mined successfully with {len(selected_txs)} transactions and {format_btc(total_fees)} BTC in fees"
 
 
 class Blockchain:
@@ -139,10 +140,10 @@ class Blockchain:
         for block in self.chain:
             print(f"\n{block}")
             if block.coinbase_tx:
-                print(f"  Coinbase: {block.total_fees:.8f} BTC to {block.miner}")
+                print(f"  Coinbase: {format_btc(block.total_fees)} BTC to {block.miner}")
             for i, tx in enumerate(block.transactions, 1):
-                inputs_str = ", ".join([f"({inp['prev_tx']}, {inp['index']})" for inp in tx.inputs])
-                outputs_str = ", ".join([f"{out['amount']:.3f} to {out['address']}" for out in tx.outputs])
+                inputs_str = ", ".join([f"({inp.prev_tx}, {inp.index})" for inp in tx.inputs])
+                outputs_str = ", ".join([f"{format_btc(out.amount, 3)} to {out.address}" for out in tx.outputs])
                 print(f"  TX {i}: {tx.tx_id}")
                 print(f"    In: {inputs_str}")
                 print(f"    Out: {outputs_str}")
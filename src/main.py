@@ -3,12 +3,31 @@ Bitcoin UTXO Simulator - Main Program
 CS 216: Introduction to Blockchain
 """
 
+import sys
+
 from utxo_manager import UTXOManager
 from mempool import Mempool
-from transaction import Transaction, create_simple_transaction
+from transaction import create_simple_transaction, DEFAULT_FEE
 from validator import TransactionValidator
 from block import mine_block, Blockchain
 from test_scenarios import TestScenarios
+from units import format_btc, to_satoshis
+
+
+MENU = (
+    "\n" + "="*60 + "\n"
+    "Main Menu:\n"
+    + "="*60 + "\n"
+    "1. Create new transaction\n"
+    "2. View UTXO set\n"
+    "3. View mempool\n"
+    "4. Mine block\n"
+    "5. Run test scenarios\n"
+    "6. View blockchain\n"
+    "7. Check balance\n"
+    "8. Exit\n"
+    + "="*60 + "\n"
+)
 
 
 class BitcoinSimulator:
@@ -35,35 +54,27 @@ class BitcoinSimulator:
         ]
         
         for index, (owner, amount) in enumerate(genesis_utxos):
-            self.utxo_manager.add_utxo("genesis", index, amount, owner)
+            self.utxo_manager.add_utxo("genesis", index, to_satoshis(amount), owner)
     
     def display_banner(self):
         """Display welcome banner"""
-        print("\n" + "="*60)
-        print("=== Bitcoin Transaction Simulator ===")
-        print("="*60)
-        print("\nInitial UTXOs (Genesis Block):")
-        print("  - Alice: 50.0 BTC")
-        print("  - Bob: 30.0 BTC")
-        print("  - Charlie: 20.0 BTC")
-        print("  - David: 10.0 BTC")
-        print("  - Eve: 5.0 BTC")
-        print(f"\nTotal Supply: {self.utxo_manager.get_total_supply():.8f} BTC")
+        # One write per screen instead of a print() per line
+        sys.stdout.write(
+            "\n" + "="*60 + "\n"
+            "=== Bitcoin Transaction Simulator ===\n"
+            + "="*60 + "\n"
+            "\nInitial UTXOs (Genesis Block):\n"
+            "  - Alice: 50.0 BTC\n"
+            "  - Bob: 30.0 BTC\n"
+            "  - Charlie: 20.0 BTC\n"
+            "  - David: 10.0 BTC\n"
+            "  - Eve: 5.0 BTC\n"
+            f"\nTotal Supply: {format_btc(self.utxo_manager.get_total_supply())} BTC\n"
+        )
     
     def display_menu(self):
         """Display main menu"""
-        print("\n" + "="*60)
-        print("Main Menu:")
-        print("="*60)
-        print("1. Create new transaction")
-        print("2. View UTXO set")
-        print("3. View mempool")
-        print("4. Mine block")
-        print("5. Run test scenarios")
-        print("6. View blockchain")
-        print("7. Check balance")
-        print("8. Exit")
-        print("="*60)
+        sys.stdout.write(MENU)
     
     def create_transaction_interactive(self):
         """Interactive transaction creation"""
@@ -74,7 +85,7 @@ class BitcoinSimulator:
         
         # Check balance
         balance = self.utxo_manager.get_balance(sender)
-        print(f"Available balance: {balance:.8f} BTC")
+        print(f"Available balance: {format_btc(balance)} BTC")
         
         if balance <= 0:
             print(f"Error: {sender} has no funds")
@@ -85,7 +96,7 @@ class BitcoinSimulator:
         
         # Get amount
         try:
-            amount = float(input("Enter amount (BTC): ").strip())
+            amount = to_satoshis(input("Enter amount (BTC): ").strip())
         except ValueError:
             print("Error: Invalid amount")
             return
@@ -97,16 +108,16 @@ class BitcoinSimulator:
         # Get fee (optional)
         try:
             fee_input = input("Enter fee (BTC) [default: 0.001]: ").strip()
-            fee = float(fee_input) if fee_input else 0.001
+            fee = to_satoshis(fee_input) if fee_input else DEFAULT_FEE
         except ValueError:
-            fee = 0.001
+            fee = DEFAULT_FEE
         
         # Create transaction
         print("\nCreating transaction...")
         tx = create_simple_transaction(sender, recipient, amount, self.utxo_manager, fee)
         
         if not tx:
-            print(f"Error: Insufficient funds. {sender} needs {amount + fee:.8f} BTC (including fee)")
+            print(f"Error: Insufficient funds. {sender} needs {format_btc(amount + fee)} BTC (including fee)")
             return
         
         # Display transaction details
@@ -114,18 +125,15 @@ class BitcoinSimulator:
         print(f"  TX ID: {tx.tx_id}")
         print(f"  From: {sender}")
         print(f"  To: {recipient}")
-        print(f"  Amount: {amount:.8f} BTC")
+        print(f"  Amount: {format_btc(amount)} BTC")
         
         # Calculate change
-        total_input = sum(
-            self.utxo_manager.get_utxo(inp["prev_tx"], inp["index"])["amount"]
-            for inp in tx.inputs
-        )
+        total_input = sum(self.utxo_manager.get_amounts(tx.input_keys))
         change = total_input - amount - fee
         
-        print(f"  Fee: {fee:.8f} BTC")
+        print(f"  Fee: {format_btc(fee)} BTC")
         if change > 0:
-            print(f"  Change: {change:.8f} BTC (back to {sender})")
+            print(f"  Change: {format_btc(change)} BTC (back to {sender})")
         
         # Validate
         is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
@@ -136,39 +144,95 @@ class BitcoinSimulator:
             success, msg = self.mempool.add_transaction(tx, self.utxo_manager)
             if success:
                 print(f"✓ Transaction added to mempool")
-                print(f"  Mempool now has {len(self.mempool.transactions)} transaction(s)")
+                print(f"  Mempool now has {len(self.mempool)} transaction(s)")
             else:
                 print(f"✗ Failed to add to mempool: {msg}")
         else:
             print("✗ Transaction validation failed")
     
+    def create_transaction(self, sender: str, recipient: str, amount: int, fee: int = DEFAULT_FEE):
+        """
+        Build a transaction and submit it to the mempool, without any I/O.
+        
+        Args:
+            sender: Sender address
+            recipient: Recipient address
+            amount: Amount in satoshis
+            fee: Fee in satoshis
+            
+        Returns:
+            Tuple (transaction or None if rejected, message: str)
+        """
+        tx = create_simple_transaction(sender, recipient, amount, self.utxo_manager, fee)
+        if not tx:
+            return None, f"Insufficient funds. {sender} needs {format_btc(amount + fee)} BTC (including fee)"
+        success, message = self.mempool.add_transaction(tx, self.utxo_manager)
+        return (tx if success else None), message
+    
+    def mine(self, miner_address: str, num_txs: int = 5):
+        """
+        Mine a block from the mempool and append it to the chain, without any I/O.
+        
+        Returns:
+            Tuple (block or None, message: str)
+        """
+        block, message = mine_block(miner_address, self.mempool, self.utxo_manager, num_txs)
+        if block:
+            self.blockchain.add_block(block)
+        return block, message
+    
+    def dispatch(self, command: str, *args):
+        """
+        Run one simulator operation by name, bypassing the menu and prompts.
+        
+        Commands:
+            "create" (sender, recipient, amount, fee=DEFAULT_FEE) -> (tx, message)
+            "mine" (miner_address, num_txs=5) -> (block, message)
+            "balance" (address) -> int satoshis
+        """
+        handlers = {
+            "create": self.create_transaction,
+            "mine": self.mine,
+            "balance": self.utxo_manager.get_balance,
+        }
+        return handlers[command](*args)
+    
+    def run_commands(self, commands):
+        """
+        Run a scripted list of commands, e.g. [("create", "Alice", "Bob", 10_000), ("mine", "Miner")].
+        
+        Returns:
+            List of results, one per command
+        """
+        return [self.dispatch(command, *args) for command, *args in commands]
+    
     def view_utxo_set(self):
         """Display current UTXO set"""
         self.utxo_manager.display_utxos()
-        print(f"Total Supply: {self.utxo_manager.get_total_supply():.8f} BTC")
+        print(f"Total Supply: {format_btc(self.utxo_manager.get_total_supply())} BTC")
     
     def view_mempool(self):
         """Display mempool contents"""
         self.mempool.display(self.utxo_manager)
-        if self.mempool.transactions:
+        if self.mempool:
             total_fees = self.mempool.get_total_fees(self.utxo_manager)
-            print(f"Total fees in mempool: {total_fees:.8f} BTC")
+            print(f"Total fees in mempool: {format_btc(total_fees)} BTC")
     
     def mine_block_interactive(self):
         """Interactive block mining"""
         print("\n--- Mine Block ---")
         
-        if not self.mempool.transactions:
+        if not self.mempool:
             print("Error: No transactions in mempool to mine")
             return
         
         miner_address = input("Enter miner address: ").strip()
         
         try:
-            num_txs_input = input(f"Number of transactions to include [max {len(self.mempool.transactions)}]: ").strip()
-            num_txs = int(num_txs_input) if num_txs_input else len(self.mempool.transactions)
+            num_txs_input = input(f"Number of transactions to include [max {len(self.mempool)}]: ").strip()
+            num_txs = int(num_txs_input) if num_txs_input else len(self.mempool)
         except ValueError:
-            num_txs = len(self.mempool.transactions)
+            num_txs = len(self.mempool)
         
         print(f"\nMining block...")
         print(f"  Miner: {miner_address}")
@@ -176,29 +240,23 @@ class BitcoinSimulator:
         
         # Get fees before mining
         selected_txs = self.mempool.get_top_transactions(num_txs, self.utxo_manager)
-        total_fees = sum(tx.calculate_fee(self.utxo_manager) for tx in selected_txs)
+        total_fees = sum(self.mempool.get_fee(tx.tx_id) for tx in selected_txs)
         
         # Mine block
-        block, message = mine_block(miner_address, self.mempool, self.utxo_manager, num_txs)
+        block, message = self.mine(miner_address, num_txs)
         
         if block:
-            self.blockchain.add_block(block)
             print(f"\n✓ {message}")
             print(f"  Block #{block.block_number}")
             print(f"  Transactions mined: {len(block.transactions)}")
-            print(f"  Total fees: {total_fees:.8f} BTC")
-            print(f"  Miner reward: {total_fees:.8f} BTC to {miner_address}")
-            print(f"  Remaining in mempool: {len(self.mempool.transactions)}")
+            print(f"  Total fees: {format_btc(total_fees)} BTC")
+            print(f"  Miner reward: {format_btc(total_fees)} BTC to {miner_address}")
+            print(f"  Remaining in mempool: {len(self.mempool)}")
         else:
             print(f"\n✗ Mining failed: {message}")
     
     def run_test_scenarios(self):
         """Run all test scenarios"""
-        # Save current state
-        saved_utxo = self.utxo_manager.utxo_set.copy()
-        saved_mempool_txs = self.mempool.transactions.copy()
-        saved_mempool_spent = self.mempool.spent_utxos.copy()
-        
         print("\n" + "="*60)
         print("Running Test Scenarios")
         print("="*60)
@@ -210,14 +268,15 @@ class BitcoinSimulator:
             print("Tests cancelled")
             return
         
-        # Run tests
-        test_runner = TestScenarios(self.utxo_manager, self.mempool)
-        test_runner.run_all_tests()
-        
-        # Restore state
-        self.utxo_manager.utxo_set = saved_utxo
-        self.mempool.transactions = saved_mempool_txs
-        self.mempool.spent_utxos = saved_mempool_spent
+        # Record changes made by the tests so they can be undone
+        utxo_token = self.utxo_manager.begin_snapshot()
+        mempool_token = self.mempool.begin_snapshot()
+        try:
+            test_runner = TestScenarios(self.utxo_manager, self.mempool)
+            test_runner.run_all_tests()
+        finally:
+            self.mempool.rollback(mempool_token)
+            self.utxo_manager.rollback(utxo_token)
         
         print("\n✓ System state restored")
     
@@ -231,18 +290,27 @@ class BitcoinSimulator:
         address = input("Enter address: ").strip()
         balance = self.utxo_manager.get_balance(address)
         
-        print(f"\n{address}: {balance:.8f} BTC")
+        print(f"\n{address}: {format_btc(balance)} BTC")
         
         # Show UTXOs
         utxos = self.utxo_manager.get_utxos_for_owner(address)
         if utxos:
             print(f"\nUTXOs ({len(utxos)}):")
             for tx_id, index, amount in utxos:
-                print(f"  - ({tx_id}, {index}): {amount:.8f} BTC")
+                print(f"  - ({tx_id}, {index}): {format_btc(amount)} BTC")
     
     def run(self):
         """Main program loop"""
         self.display_banner()
+        menu_actions = {
+            '1': self.create_transaction_interactive,
+            '2': self.view_utxo_set,
+            '3': self.view_mempool,
+            '4': self.mine_block_interactive,
+            '5': self.run_test_scenarios,
+            '6': self.view_blockchain,
+            '7': self.check_balance,
+        }
         
         while True:
             self.display_menu()
@@ -250,25 +318,15 @@ class BitcoinSimulator:
             try:
                 choice = input("\nEnter choice (1-8): ").strip()
                 
-                if choice == '1':
-                    self.create_transaction_interactive()
-                elif choice == '2':
-                    self.view_utxo_set()
-                elif choice == '3':
-                    self.view_mempool()
-                elif choice == '4':
-                    self.mine_block_interactive()
-                elif choice == '5':
-                    self.run_test_scenarios()
-                elif choice == '6':
-                    self.view_blockchain()
-                elif choice == '7':
-                    self.check_balance()
-                elif choice == '8':
+                if choice == '8':
                     print("\n" + "="*60)
                     print("Thank you for using Bitcoin UTXO Simulator!")
                     print("="*60)
                     break
+                
+                action = menu_actions.get(choice)
+                if action:
+                    action()
                 else:
                     print("\n✗ Invalid choice. Please enter 1-8.")
             
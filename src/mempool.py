@@ -3,7 +3,12 @@ Mempool - Memory pool for unconfirmed transactions
 This is the "waiting area" for transactions before they're mined into blocks
 """
 
-from validator import TransactionValidator
+import heapq
+import itertools
+import sys
+
+from units import format_btc
+from validator import TransactionValidator, format_valid
 
 
 class Mempool:
@@ -14,8 +19,25 @@ class Mempool:
         Args:
             max_size: Maximum number of transactions in mempool
         """
-        self.transactions = []  # List of Transaction objects
-        self.spent_utxos = set()  # Set of (tx_id, index) tuples being spent
+        # Per-field columns keyed by tx_id. tx_index is kept in arrival order.
+        self.tx_index = {}  # tx_id -> Transaction
+        self.fees = {}  # tx_id -> fee, computed once on admission
+        self.total_fees = 0  # running sum of self.fees, in satoshis
+        # Min-heap of (fee, seq, tx_id). Removal is lazy: an entry is live
+        # only while seqs[tx_id] still matches its seq.
+        self.fee_heap = []
+        self.seqs = {}  # tx_id -> arrival sequence number
+        self._counter = itertools.count()
+        # Bumped on every change; the top-N cache is valid for one version
+        self.version = 0
+        self._top_cache = None  # (version, n, transactions)
+        self._journal = None  # undo log, only kept while a snapshot is open
+        # (tx_id, index) -> spending tx_id for every UTXO being spent. Keyed by
+        # the outpoint itself: outpoint_id() can collide, and two colliding
+        # spends must not overwrite each other. Removals only tombstone their
+        # keys; look up with spent_by().
+        self.spent_utxos = {}
+        self._tombstones = set()
         self.max_size = max_size
         self.validator = TransactionValidator()
     
@@ -30,28 +52,137 @@ class Mempool:
         Returns:
             Tuple (success: bool, message: str)
         """
-        # Check if mempool is full
-        if len(self.transactions) >= self.max_size:
-            # Evict lowest fee transaction
-            success = self._evict_lowest_fee(utxo_manager)
-            if not success:
-                return False, "Mempool full and cannot evict lower fee transactions"
+        # Resubmitting a pending transaction needs no validation at all
+        known = self._check_known(tx)
+        if known:
+            return known
         
-        # Validate transaction
-        is_valid, message = self.validator.validate_transaction(tx, utxo_manager, self)
+        # Fast reject: an input already claimed by a pending transaction is a
+        # hard conflict, so skip validation entirely
+        conflict = self.validator.find_conflict(tx, self)
+        if conflict:
+            return False, conflict
+        
+        # Validate transaction; rule 5 was settled above, so the validator
+        # is not handed the mempool to check it again
+        is_valid, result = self.validator.check_transaction(tx, utxo_manager)
         
         if not is_valid:
-            return False, message
+            return False, result
+        
+        return self._admit(tx, utxo_manager, result)
+    
+    def add_batch(self, txs, utxo_manager):
+        """
+        Validate and add several transactions, sharing one UTXO lookup
+        across the whole batch instead of one per transaction.
         
-        # Add transaction to mempool
-        self.transactions.append(tx)
+        The batch is validated in one pass against the mempool as it stood
+        before the call; validate_transactions rejects a transaction that
+        spends an input already spent earlier in the batch, so the
+        first-seen one still wins as with repeated add_transaction calls.
+        The valid ones are then admitted in order. Which transactions are
+        admitted matches repeated add_transaction calls, though a rejection
+        can be worded differently (an in-batch conflict names "this batch").
+        (When the mempool is full, a transaction conflicting with one evicted
+        during the batch is still rejected.)
         
-        # Mark UTXOs as spent in mempool
-        for inp in tx.inputs:
-            input_key = (inp["prev_tx"], inp["index"])
-            self.spent_utxos.add(input_key)
+        Args:
+            txs: List of Transaction objects
+            utxo_manager: UTXO manager instance
+            
+        Returns:
+            List of (success: bool, message: str), one per transaction
+        """
+        results = [None] * len(txs)
+        to_validate = []
+        for pos, tx in enumerate(txs):
+            known = self._check_known(tx)
+            if known:
+                results[pos] = known
+            else:
+                to_validate.append((pos, tx))
         
-        return True, message
+        verdicts = self.validator.check_transactions(
+            [tx for _, tx in to_validate], utxo_manager, self
+        )
+        for (pos, tx), (is_valid, result) in zip(to_validate, verdicts):
+            if is_valid:
+                results[pos] = self._admit(tx, utxo_manager, result)
+            else:
+                # A repeat of a transaction admitted earlier in this batch
+                # is reported as known, not as a conflict with itself
+                results[pos] = self._check_known(tx) or (False, result)
+        
+        return results
+    
+    def _check_known(self, tx):
+        """Return the result for a tx whose id is already pending, else None"""
+        pending = self.tx_index.get(tx.tx_id)
+        if pending is None:
+            return None
+        if pending.inputs == tx.inputs and pending.outputs == tx.outputs:
+            return True, "Transaction already in mempool"
+        return False, f"Invalid: A different transaction with ID {tx.tx_id} is already in mempool"
+    
+    def spent_by(self, input_key):
+        """
+        Find the pending transaction that spends an outpoint.
+        
+        Args:
+            input_key: (tx_id, index) of the outpoint
+            
+        Returns:
+            ID of the spending transaction, or None if the outpoint is unspent
+        """
+        if input_key in self._tombstones:
+            return None
+        return self.spent_utxos.get(input_key)
+    
+    def is_spent(self, input_key):
+        """Check whether a pending transaction already spends an outpoint"""
+        return self.spent_by(input_key) is not None
+    
+    def _mark_spent(self, tx):
+        """Record tx as the spender of each of its inputs"""
+        if self._tombstones:
+            self._tombstones.difference_update(tx.input_keys)
+        self.spent_utxos.update(dict.fromkeys(tx.input_keys, tx.tx_id))
+    
+    def _admit(self, tx, utxo_manager, fee):
+        """
+        Make room if needed and insert a transaction that passed validation.
+        
+        Args:
+            tx: Transaction object
+            utxo_manager: UTXO manager instance
+            fee: Fee in satoshis, as worked out by the validator
+            
+        Returns:
+            Tuple (success: bool, message: str)
+        """
+        if len(self.tx_index) >= self.max_size:
+            # Evict lowest fee transaction
+            success = self._evict_lowest_fee(utxo_manager)
+            if not success:
+                return False, "Mempool full and cannot evict lower fee transactions"
+        
+        self._insert(tx, fee)
+        return True, format_valid(fee)
+    
+    def _insert(self, tx, fee):
+        """Add a validated transaction and mark its inputs as spent"""
+        tx.finalize()
+        self.version += 1
+        self.tx_index[tx.tx_id] = tx
+        self.fees[tx.tx_id] = fee
+        self.total_fees += fee
+        seq = next(self._counter)
+        self.seqs[tx.tx_id] = seq
+        heapq.heappush(self.fee_heap, (fee, seq, tx.tx_id))
+        self._mark_spent(tx)
+        if self._journal is not None:
+            self._journal.append(("add", tx.tx_id))
     
     def remove_transaction(self, tx_id: str):
         """
@@ -63,24 +194,67 @@ class Mempool:
         Returns:
             Removed transaction or None if not found
         """
-        for i, tx in enumerate(self.transactions):
-            if tx.tx_id == tx_id:
-                removed_tx = self.transactions.pop(i)
-                
-                # Remove spent UTXOs from tracking
-                for inp in removed_tx.inputs:
-                    input_key = (inp["prev_tx"], inp["index"])
-                    self.spent_utxos.discard(input_key)
-                
-                return removed_tx
-        return None
+        if tx_id not in self.tx_index:
+            return None
+        removed_tx, fee, seq = self._pop(tx_id)
+        if self._journal is not None:
+            self._journal.append(("remove", removed_tx, fee, seq))
+        # Rebuild once dead heap entries outnumber live ones
+        if len(self.fee_heap) > 2 * len(self.seqs) + 16:
+            self._compact_heap()
+        
+        return removed_tx
+    
+    def _pop(self, tx_id):
+        """
+        Drop a pending transaction from every index in O(inputs).
+        
+        Its heap entry is left to go stale. Used by remove_transaction (and
+        so by eviction) and by rollback.
+        
+        Returns:
+            Tuple (transaction, fee, seq)
+        """
+        removed_tx = self.tx_index.pop(tx_id)
+        fee = self.fees.pop(tx_id)
+        seq = self.seqs.pop(tx_id)
+        self.total_fees -= fee
+        self.version += 1
+        # Tombstone its outpoints instead of deleting; purge in bulk once they
+        # pile up. Tombstones are per outpoint so a colliding outpoint_id
+        # never hides another pending spend
+        self._tombstones.update(removed_tx.input_keys)
+        if len(self._tombstones) > len(self.spent_utxos) // 4:
+            self._purge_tombstones()
+        return removed_tx, fee, seq
+    
+    def _purge_tombstones(self):
+        """Delete tombstoned outpoints from spent_utxos in one pass"""
+        spent_utxos = self.spent_utxos
+        for input_key in self._tombstones:
+            del spent_utxos[input_key]
+        self._tombstones.clear()
     
     def get_transaction(self, tx_id: str):
         """Get transaction by ID"""
-        for tx in self.transactions:
-            if tx.tx_id == tx_id:
-                return tx
-        return None
+        return self.tx_index.get(tx_id)
+    
+    def get_fee(self, tx_id: str):
+        """
+        Get the fee of a pending transaction.
+        
+        Inputs of a pending transaction can't change until it is mined,
+        so the fee worked out on admission stays valid.
+        """
+        return self.fees[tx_id]
+    
+    @property
+    def transactions(self):
+        """Pending transactions in arrival order"""
+        return list(self.tx_index.values())
+    
+    def __len__(self):
+        return len(self.tx_index)
     
     def get_top_transactions(self, n: int, utxo_manager):
         """
@@ -88,87 +262,134 @@ class Mempool:
         
         Args:
             n: Number of transactions to return
-            utxo_manager: UTXO manager to calculate fees
+            utxo_manager: Unused; fees are cached on admission
             
         Returns:
             List of transactions sorted by fee (descending)
         """
-        # Calculate fees for all transactions
-        tx_with_fees = []
-        for tx in self.transactions:
-            fee = tx.calculate_fee(utxo_manager)
-            tx_with_fees.append((tx, fee))
+        # Reused until the mempool changes, e.g. between the interactive
+        # fee preview and mine_block selecting the same transactions
+        cache = self._top_cache
+        if cache is not None and cache[0] == self.version and cache[1] == n:
+            return list(cache[2])
         
-        # Sort by fee (descending)
-        tx_with_fees.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top N transactions
-        return [tx for tx, fee in tx_with_fees[:n]]
+        # Highest fee first, ties in arrival order
+        live = (entry for entry in self.fee_heap if self.seqs.get(entry[2]) == entry[1])
+        top = heapq.nlargest(n, live, key=lambda entry: (entry[0], -entry[1]))
+        selected = [self.tx_index[tx_id] for _, _, tx_id in top]
+        self._top_cache = (self.version, n, selected)
+        return list(selected)
     
     def clear(self):
         """Clear all transactions from mempool"""
-        self.transactions.clear()
+        if self._journal is not None:
+            # Go through remove_transaction so the snapshot can undo it
+            for tx_id in list(self.tx_index):
+                self.remove_transaction(tx_id)
+            return
+        self.version += 1
+        self.tx_index.clear()
+        self.fees.clear()
+        self.total_fees = 0
+        self.fee_heap.clear()
+        self.seqs.clear()
         self.spent_utxos.clear()
+        self._tombstones.clear()
     
     def _evict_lowest_fee(self, utxo_manager):
         """
         Evict the transaction with the lowest fee.
         
         Args:
-            utxo_manager: UTXO manager to calculate fees
+            utxo_manager: Unused; fees are cached on admission
             
         Returns:
             True if eviction successful, False otherwise
         """
-        if not self.transactions:
-            return False
+        # Lowest fee; ties go to the earliest arrival. Skip stale entries.
+        while self.fee_heap:
+            _, seq, tx_id = heapq.heappop(self.fee_heap)
+            if self.seqs.get(tx_id) == seq:
+                self.remove_transaction(tx_id)
+                return True
         
-        # Find transaction with lowest fee
-        min_fee = float('inf')
-        min_fee_tx = None
+        return False
+    
+    def begin_snapshot(self):
+        """
+        Start recording changes so they can be undone with rollback().
         
-        for tx in self.transactions:
-            fee = tx.calculate_fee(utxo_manager)
-            if fee < min_fee:
-                min_fee = fee
-                min_fee_tx = tx
+        Snapshots nest; each one costs O(1) to take.
         
-        if min_fee_tx:
-            self.remove_transaction(min_fee_tx.tx_id)
-            return True
+        Returns:
+            Token to pass to rollback()
+        """
+        if self._journal is None:
+            self._journal = []
+        return len(self._journal)
+    
+    def rollback(self, token):
+        """
+        Undo every change made since begin_snapshot() returned token.
         
-        return False
+        Args:
+            token: Value returned by begin_snapshot()
+        """
+        journal = self._journal
+        for entry in reversed(journal[token:]):
+            if entry[0] == "add":
+                self._pop(entry[1])
+            else:
+                _, tx, fee, seq = entry
+                self.tx_index[tx.tx_id] = tx
+                self.fees[tx.tx_id] = fee
+                self.seqs[tx.tx_id] = seq
+                self._mark_spent(tx)
+        del journal[token:]
+        if token == 0:
+            self._journal = None
+        self.version += 1
+        self.total_fees = sum(self.fees.values())
+        # Put restored transactions back in arrival order
+        self.tx_index = {tx_id: self.tx_index[tx_id] for tx_id in sorted(self.seqs, key=self.seqs.get)}
+        # Restored transactions may or may not still have heap entries
+        self.fee_heap = [(self.fees[tx_id], seq, tx_id) for tx_id, seq in self.seqs.items()]
+        heapq.heapify(self.fee_heap)
+    
+    def _compact_heap(self):
+        """Drop stale entries left behind by lazy removal"""
+        self.fee_heap = [entry for entry in self.fee_heap if self.seqs.get(entry[2]) == entry[1]]
+        heapq.heapify(self.fee_heap)
     
     def display(self, utxo_manager=None):
         """Display all transactions in mempool"""
-        if not self.transactions:
+        if not self.tx_index:
             print("\nMempool is empty")
             return
         
-        print(f"\n=== Mempool ({len(self.transactions)} transactions) ===")
+        # Build the whole listing and write it once
+        lines = [f"\n=== Mempool ({len(self.tx_index)} transactions) ==="]
         
-        for i, tx in enumerate(self.transactions, 1):
-            fee = tx.calculate_fee(utxo_manager) if utxo_manager else 0
-            
+        for i, tx in enumerate(self.tx_index.values(), 1):
             inputs_summary = ", ".join([
-                f"({inp['prev_tx']}, {inp['index']})"
+                f"({inp.prev_tx}, {inp.index})"
                 for inp in tx.inputs
             ])
             
             outputs_summary = ", ".join([
-                f"{out['amount']:.3f} BTC to {out['address']}"
+                f"{format_btc(out.amount, 3)} BTC to {out.address}"
                 for out in tx.outputs
             ])
             
-            print(f"\n{i}. TX {tx.tx_id}")
-            print(f"   Inputs: {inputs_summary}")
-            print(f"   Outputs: {outputs_summary}")
-            print(f"   Fee: {fee:.8f} BTC")
-        print()
+            lines.append(
+                f"\n{i}. TX {tx.tx_id}\n"
+                f"   Inputs: {inputs_summary}\n"
+                f"   Outputs: {outputs_summary}\n"
+                f"   Fee: {format_btc(self.fees[tx.tx_id])} BTC"
+            )
+        lines.append("\n")
+        sys.stdout.write("\n".join(lines))
     
     def get_total_fees(self, utxo_manager):
-        """Calculate total fees from all transactions in mempool"""
-        total = 0.0
-        for tx in self.transactions:
-            total += tx.calculate_fee(utxo_manager)
-        return total
\ No newline at end of file
+        """Total fees from all transactions in mempool, kept up to date on add/remove"""
+        return self.total_fees
\ No newline at end of file
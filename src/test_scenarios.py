@@ -1,12 +1,18 @@
 """
-Test Scenarios - All 10 mandatory test cases from the assignment
+Test Scenarios - All 10 mandatory test cases from the assignment, plus
+regression tests
 """
 
-from transaction import Transaction, create_simple_transaction
+import contextlib
+import io
+import sys
+
+from transaction import Transaction, create_simple_transaction, outpoint_id
 from utxo_manager import UTXOManager
 from mempool import Mempool
-from validator import TransactionValidator
+from validator import validate_transaction as _validate
 from block import mine_block
+from units import format_btc, to_satoshis
 
 
 class TestScenarios:
@@ -15,10 +21,9 @@ class TestScenarios:
     def __init__(self, utxo_manager, mempool):
         self.utxo_manager = utxo_manager
         self.mempool = mempool
-        self.validator = TransactionValidator()
     
     def run_all_tests(self):
-        """Run all 10 test scenarios"""
+        """Run all test scenarios"""
         print("\n" + "="*60)
         print("Running All Test Scenarios")
         print("="*60)
@@ -33,14 +38,20 @@ class TestScenarios:
             self.test_7_zero_fee_transaction,
             self.test_8_race_attack,
             self.test_9_complete_mining_flow,
-            self.test_10_unconfirmed_chain
+            self.test_10_unconfirmed_chain,
+            self.test_11_outpoint_id_collision
         ]
         
+        # Each test's output is collected and written in one go instead of
+        # going to stdout print by print
         for i, test in enumerate(tests, 1):
-            print(f"\n{'='*60}")
-            print(f"Test {i}")
-            print('='*60)
-            test()
+            buf = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(buf):
+                    print(f"\n{'='*60}\nTest {i}\n{'='*60}")
+                    test()
+            finally:
+                sys.stdout.write(buf.getvalue())
         
         print("\n" + "="*60)
         print("All Tests Completed")
@@ -52,14 +63,14 @@ class TestScenarios:
         print("Description: Alice sends 10 BTC to Bob with change and fee")
         
         # Create transaction
-        tx = create_simple_transaction("Alice", "Bob", 10.0, self.utxo_manager, fee=0.001)
+        tx = create_simple_transaction("Alice", "Bob", to_satoshis(10.0), self.utxo_manager, fee=to_satoshis(0.001))
         
         if not tx:
             print("❌ FAILED: Could not create transaction")
             return
         
         # Validate
-        is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+        is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
         
         print(f"\nTransaction Details:")
         print(f"  TX ID: {tx.tx_id}")
@@ -67,7 +78,7 @@ class TestScenarios:
         print(f"  Recipient: Bob")
         print(f"  Amount: 10.0 BTC")
         print(f"  Fee: 0.001 BTC")
-        print(f"  Change: {sum(out['amount'] for out in tx.outputs if out['address'] == 'Alice'):.8f} BTC back to Alice")
+        print(f"  Change: {format_btc(sum(out.amount for out in tx.outputs if out.address == 'Alice'))} BTC back to Alice")
         print(f"\nValidation: {message}")
         
         if is_valid:
@@ -92,24 +103,24 @@ class TestScenarios:
         # Create transaction manually with multiple inputs
         tx = Transaction()
         
-        total_input = 0.0
+        total_input = 0
         for tx_id, index, amount in alice_utxos[:2]:  # Use first 2 UTXOs
             tx.add_input(tx_id, index, "Alice")
             total_input += amount
         
         # Send most to Bob, keep some change
-        send_amount = total_input - 0.5  # Keep 0.5 as fee + change
-        tx.add_output(send_amount - 0.001, "Bob")  # 0.001 fee
-        tx.add_output(0.499, "Alice")  # Change
+        send_amount = total_input - to_satoshis(0.5)  # Keep 0.5 as fee + change
+        tx.add_output(send_amount - to_satoshis(0.001), "Bob")  # 0.001 fee
+        tx.add_output(to_satoshis(0.499), "Alice")  # Change
         
         # Validate
-        is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+        is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
         
         print(f"\nTransaction Details:")
         print(f"  TX ID: {tx.tx_id}")
         print(f"  Number of Inputs: {len(tx.inputs)}")
-        print(f"  Total Input: {total_input:.8f} BTC")
-        print(f"  Output to Bob: {send_amount - 0.001:.8f} BTC")
+        print(f"  Total Input: {format_btc(total_input)} BTC")
+        print(f"  Output to Bob: {format_btc(send_amount - to_satoshis(0.001))} BTC")
         print(f"  Change to Alice: 0.499 BTC")
         print(f"  Fee: 0.001 BTC")
         print(f"\nValidation: {message}")
@@ -137,10 +148,10 @@ class TestScenarios:
         tx = Transaction()
         tx.add_input(tx_id, index, "Alice")
         tx.add_input(tx_id, index, "Alice")  # Same UTXO again!
-        tx.add_output(amount * 1.5, "Bob")  # Try to spend it twice
+        tx.add_output(amount * 3 // 2, "Bob")  # Try to spend it twice
         
         # Validate
-        is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+        is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
         
         print(f"\nTransaction Details:")
         print(f"  Attempting to spend ({tx_id}, {index}) twice")
@@ -171,12 +182,12 @@ class TestScenarios:
         # TX1: Bob -> Charlie
         tx1 = Transaction()
         tx1.add_input(tx_id, index, "Bob")
-        tx1.add_output(amount - 0.001, "Charlie")
+        tx1.add_output(amount - to_satoshis(0.001), "Charlie")
         
         # TX2: Bob -> David (same UTXO!)
         tx2 = Transaction()
         tx2.add_input(tx_id, index, "Bob")
-        tx2.add_output(amount - 0.001, "David")
+        tx2.add_output(amount - to_satoshis(0.001), "David")
         
         # Add TX1 to mempool
         success1, msg1 = temp_mempool.add_transaction(tx1, self.utxo_manager)
@@ -201,18 +212,18 @@ class TestScenarios:
         print("Description: Try to send more than available balance")
         
         # Try to create transaction with insufficient funds
-        tx = create_simple_transaction("Eve", "Alice", 100.0, self.utxo_manager)
+        tx = create_simple_transaction("Eve", "Alice", to_satoshis(100.0), self.utxo_manager)
         
         eve_balance = self.utxo_manager.get_balance("Eve")
         
-        print(f"\nEve's balance: {eve_balance:.8f} BTC")
+        print(f"\nEve's balance: {format_btc(eve_balance)} BTC")
         print(f"Attempting to send: 100.0 BTC")
         
         if tx is None:
             print("✅ PASSED - Transaction creation failed (insufficient funds)")
         else:
             # Validate to get proper error message
-            is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+            is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
             print(f"Validation: {message}")
             if not is_valid:
                 print("✅ PASSED - Transaction rejected")
@@ -235,10 +246,10 @@ class TestScenarios:
         # Create transaction with negative output
         tx = Transaction()
         tx.add_input(tx_id, index, "Alice")
-        tx.add_output(-10.0, "Bob")  # Negative amount!
+        tx.add_output(to_satoshis(-10.0), "Bob")  # Negative amount!
         
         # Validate
-        is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+        is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
         
         print(f"\nTransaction Details:")
         print(f"  Output amount: -10.0 BTC")
@@ -268,17 +279,17 @@ class TestScenarios:
         tx.add_output(amount, "David")  # Exact amount = zero fee
         
         # Validate
-        is_valid, message = self.validator.validate_transaction(tx, self.utxo_manager, self.mempool)
+        is_valid, message = _validate(tx, self.utxo_manager, self.mempool)
         
         fee = tx.calculate_fee(self.utxo_manager)
         
         print(f"\nTransaction Details:")
-        print(f"  Input: {amount:.8f} BTC")
-        print(f"  Output: {amount:.8f} BTC")
-        print(f"  Fee: {fee:.8f} BTC")
+        print(f"  Input: {format_btc(amount)} BTC")
+        print(f"  Output: {format_btc(amount)} BTC")
+        print(f"  Fee: {format_btc(fee)} BTC")
         print(f"\nValidation: {message}")
         
-        if is_valid and abs(fee) < 1e-8:
+        if is_valid and fee == 0:
             print("✅ PASSED - Zero fee transaction is valid")
         else:
             print("❌ FAILED - Zero fee should be accepted")
@@ -304,12 +315,12 @@ class TestScenarios:
         # Low-fee transaction (arrives first)
         tx_low = Transaction()
         tx_low.add_input(tx_id, index, "David")
-        tx_low.add_output(amount - 0.0001, "Merchant")  # Low fee: 0.0001 BTC
+        tx_low.add_output(amount - to_satoshis(0.0001), "Merchant")  # Low fee: 0.0001 BTC
         
         # High-fee transaction (arrives second, tries to replace)
         tx_high = Transaction()
         tx_high.add_input(tx_id, index, "David")
-        tx_high.add_output(amount - 0.01, "Attacker")  # High fee: 0.01 BTC
+        tx_high.add_output(amount - to_satoshis(0.01), "Attacker")  # High fee: 0.01 BTC
         
         # Add low-fee transaction first
         success1, msg1 = temp_mempool.add_transaction(tx_low, self.utxo_manager)
@@ -317,7 +328,7 @@ class TestScenarios:
         
         print(f"\nLow-fee TX (David -> Merchant):")
         print(f"  TX ID: {tx_low.tx_id}")
-        print(f"  Fee: {fee1:.8f} BTC")
+        print(f"  Fee: {format_btc(fee1)} BTC")
         print(f"  Status: {msg1}")
         
         # Try to add high-fee transaction
@@ -326,7 +337,7 @@ class TestScenarios:
         
         print(f"\nHigh-fee TX (David -> Attacker):")
         print(f"  TX ID: {tx_high.tx_id}")
-        print(f"  Fee: {fee2:.8f} BTC")
+        print(f"  Fee: {format_btc(fee2)} BTC")
         print(f"  Status: {msg2}")
         
         if success1 and not success2:
@@ -344,24 +355,23 @@ class TestScenarios:
         test_mempool = Mempool()
         
         # Setup: Give Alice and Bob some BTC
-        test_utxo.add_utxo("genesis", 0, 50.0, "Alice")
-        test_utxo.add_utxo("genesis", 1, 30.0, "Bob")
+        test_utxo.add_utxo("genesis", 0, to_satoshis(50.0), "Alice")
+        test_utxo.add_utxo("genesis", 1, to_satoshis(30.0), "Bob")
         
         print("\nInitial State:")
-        print(f"  Alice: {test_utxo.get_balance('Alice'):.8f} BTC")
-        print(f"  Bob: {test_utxo.get_balance('Bob'):.8f} BTC")
-        print(f"  Miner: {test_utxo.get_balance('Miner'):.8f} BTC")
+        print(f"  Alice: {format_btc(test_utxo.get_balance('Alice'))} BTC")
+        print(f"  Bob: {format_btc(test_utxo.get_balance('Bob'))} BTC")
+        print(f"  Miner: {format_btc(test_utxo.get_balance('Miner'))} BTC")
         
         # Add transactions to mempool
-        tx1 = create_simple_transaction("Alice", "Bob", 10.0, test_utxo, fee=0.002)
-        tx2 = create_simple_transaction("Bob", "Alice", 5.0, test_utxo, fee=0.003)
+        tx1 = create_simple_transaction("Alice", "Bob", to_satoshis(10.0), test_utxo, fee=to_satoshis(0.002))
+        tx2 = create_simple_transaction("Bob", "Alice", to_satoshis(5.0), test_utxo, fee=to_satoshis(0.003))
         
-        test_mempool.add_transaction(tx1, test_utxo)
-        test_mempool.add_transaction(tx2, test_utxo)
+        test_mempool.add_batch([tx1, tx2], test_utxo)
         
         print(f"\nMempool: {len(test_mempool.transactions)} transactions")
         total_fees = test_mempool.get_total_fees(test_utxo)
-        print(f"  Total fees: {total_fees:.8f} BTC")
+        print(f"  Total fees: {format_btc(total_fees)} BTC")
         
         # Mine block
         block, message = mine_block("Miner", test_mempool, test_utxo, num_txs=5)
@@ -371,9 +381,9 @@ class TestScenarios:
         
         # Verify state changes
         print("\nFinal State:")
-        print(f"  Alice: {test_utxo.get_balance('Alice'):.8f} BTC")
-        print(f"  Bob: {test_utxo.get_balance('Bob'):.8f} BTC")
-        print(f"  Miner: {test_utxo.get_balance('Miner'):.8f} BTC (received fees)")
+        print(f"  Alice: {format_btc(test_utxo.get_balance('Alice'))} BTC")
+        print(f"  Bob: {format_btc(test_utxo.get_balance('Bob'))} BTC")
+        print(f"  Miner: {format_btc(test_utxo.get_balance('Miner'))} BTC (received fees)")
         print(f"  Mempool: {len(test_mempool.transactions)} transactions")
         
         if len(test_mempool.transactions) == 0 and test_utxo.get_balance("Miner") > 0:
@@ -392,13 +402,13 @@ class TestScenarios:
         test_mempool = Mempool()
         
         # Setup
-        test_utxo.add_utxo("genesis", 0, 50.0, "Alice")
+        test_utxo.add_utxo("genesis", 0, to_satoshis(50.0), "Alice")
         
         # TX1: Alice -> Bob (creates new UTXO for Bob, but unconfirmed)
         tx1 = Transaction()
         tx1.add_input("genesis", 0, "Alice")
-        tx1.add_output(30.0, "Bob")
-        tx1.add_output(19.999, "Alice")  # Change
+        tx1.add_output(to_satoshis(30.0), "Bob")
+        tx1.add_output(to_satoshis(19.999), "Alice")  # Change
         
         # Add to mempool (not mined yet)
         success1, msg1 = test_mempool.add_transaction(tx1, test_utxo)
@@ -411,10 +421,10 @@ class TestScenarios:
         # TX2: Bob tries to spend the UTXO from TX1 (which isn't in UTXO set yet)
         tx2 = Transaction()
         tx2.add_input(tx1.tx_id, 0, "Bob")  # Try to spend unconfirmed output
-        tx2.add_output(20.0, "Charlie")
+        tx2.add_output(to_satoshis(20.0), "Charlie")
         
         # This should fail because the UTXO doesn't exist in UTXO set yet
-        is_valid, msg2 = TransactionValidator.validate_transaction(tx2, test_utxo, test_mempool)
+        is_valid, msg2 = _validate(tx2, test_utxo, test_mempool)
         
         print(f"\nTX2 (Bob -> Charlie 20 BTC):")
         print(f"  TX ID: {tx2.tx_id}")
@@ -425,4 +435,59 @@ class TestScenarios:
             print("\n✅ PASSED - Correctly rejected spending unconfirmed UTXO")
             print("Design: Cannot spend UTXOs until transaction is mined")
         else:
-            print("\n❌ FAILED - Should reject unconfirmed UTXOs")
\ No newline at end of file
+            print("\n❌ FAILED - Should reject unconfirmed UTXOs")
+    
+    def test_11_outpoint_id_collision(self):
+        """Test 11: Outpoint ID Collision (regression)"""
+        print("Test 11: Outpoint ID Collision")
+        print("Description: Two outpoints share an outpoint_id; neither may be mistaken for the other")
+        print("Design Decision: outpoint_id only prefilters; spends are tracked by (tx_id, index)")
+        
+        # Create a temporary test environment
+        test_utxo = UTXOManager()
+        test_mempool = Mempool()
+        
+        # Setup: these two tx ids have the same 48-bit hash, so output 0 of
+        # each gets the same outpoint_id
+        prev_a, prev_b = "2417f88fff53", "52e2814a41df"
+        test_utxo.add_utxo(prev_a, 0, to_satoshis(10.0), "Alice")
+        test_utxo.add_utxo(prev_b, 0, to_satoshis(10.0), "Bob")
+        for index in range(8):
+            test_utxo.add_utxo("genesis", index, to_satoshis(1.0), "Carol")
+        print(f"\nShared outpoint_id: {outpoint_id(prev_a, 0) == outpoint_id(prev_b, 0)}")
+        
+        # TX1 has enough inputs for rule 2 to go through the outpoint_id set;
+        # the colliding pair must not be reported as one UTXO used twice
+        tx1 = Transaction()
+        tx1.add_input(prev_a, 0, "Alice")
+        tx1.add_input(prev_b, 0, "Bob")
+        for index in range(8):
+            tx1.add_input("genesis", index, "Carol")
+        tx1.add_output(to_satoshis(27.999), "Dave")
+        valid1, msg1 = _validate(tx1, test_utxo)
+        print(f"\nTX1 (10 inputs incl. both colliding outpoints): {msg1}")
+        
+        # TX2 and TX3 each spend one of the colliding outpoints
+        tx2 = Transaction()
+        tx2.add_input(prev_a, 0, "Alice")
+        tx2.add_output(to_satoshis(9.999), "Dave")
+        tx3 = Transaction()
+        tx3.add_input(prev_b, 0, "Bob")
+        tx3.add_output(to_satoshis(9.999), "Dave")
+        (success2, msg2), (success3, msg3) = test_mempool.add_batch([tx2, tx3], test_utxo)
+        print(f"\nTX2 (Alice spends {prev_a}:0): {msg2}")
+        print(f"TX3 (Bob spends {prev_b}:0): {msg3}")
+        
+        # Dropping TX2 must release only its own outpoint, not TX3's
+        test_mempool.remove_transaction(tx2.tx_id)
+        tx4 = Transaction()
+        tx4.add_input(prev_b, 0, "Bob")
+        tx4.add_output(to_satoshis(9.99), "Mallory")
+        success4, msg4 = test_mempool.add_transaction(tx4, test_utxo)
+        print("\nTX2 removed from mempool")
+        print(f"TX4 (Bob double-spends {prev_b}:0): {msg4}")
+        
+        if valid1 and success2 and success3 and not success4:
+            print("\n✅ PASSED - Colliding outpoints tracked separately")
+        else:
+            print("\n❌ FAILED - Colliding outpoints interfered")
\ No newline at end of file
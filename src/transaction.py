@@ -1,8 +1,70 @@
 """
 Transaction - Defines Bitcoin transaction structure and basic operations
 """
-import time
-import random
+import hashlib
+import struct
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+from units import format_btc, to_satoshis
+
+
+@lru_cache(maxsize=4096)
+def _tx_id_hash(tx_id: str) -> int:
+    """48-bit hash of a transaction id"""
+    return int.from_bytes(hashlib.blake2b(tx_id.encode(), digest_size=6).digest(), "little")
+
+
+# Largest output index canonical_bytes can encode (a 4-byte field)
+MAX_OUTPUT_INDEX = (1 << 32) - 1
+
+
+def outpoint_id(tx_id: str, index: int):
+    """
+    Cheap-to-hash stand-in for an outpoint (tx_id, index).
+    
+    An index below 2**16 is packed with a 48-bit hash of the tx id into one
+    int, so a set of them hashes a single int instead of a tuple of a str
+    and an int. A larger index doesn't fit and gets the (tx_id, index)
+    tuple itself. Distinct outpoints can still share a packed id, so an
+    equal outpoint_id only means "maybe the same outpoint": confirm on the
+    (tx_id, index), and never key a dict by it where one outpoint could
+    overwrite another.
+    
+    Args:
+        tx_id: Transaction ID
+        index: Output index, 0 to MAX_OUTPUT_INDEX
+        
+    Raises:
+        ValueError: If index is out of range
+    """
+    if 0 <= index <= 0xFFFF:
+        return (_tx_id_hash(tx_id) << 16) | index
+    if 0 <= index <= MAX_OUTPUT_INDEX:
+        return (tx_id, index)
+    raise ValueError(f"Invalid: Output index {index} out of range (0-{MAX_OUTPUT_INDEX})")
+
+
+@dataclass(frozen=True, slots=True)
+class TxIn:
+    """Reference to the UTXO a transaction spends; immutable, see Transaction.inputs"""
+    prev_tx: str
+    index: int
+    owner: str
+
+    def to_dict(self):
+        return {"prev_tx": self.prev_tx, "index": self.index, "owner": self.owner}
+
+
+@dataclass(frozen=True, slots=True)
+class TxOut:
+    """Amount (in satoshis) paid to an address; immutable, see Transaction.outputs"""
+    amount: int
+    address: str
+
+    def to_dict(self):
+        return {"amount": self.amount, "address": self.address}
 
 
 class Transaction:
@@ -11,18 +73,85 @@ class Transaction:
         Initialize a transaction.
         
         Args:
-            tx_id: Unique transaction identifier (auto-generated if None)
+            tx_id: Unique transaction identifier (derived from the contents if None)
         """
-        self.tx_id = tx_id if tx_id else self.generate_tx_id()
-        self.inputs = []  # List of input dicts
-        self.outputs = []  # List of output dicts
+        # Interned: tx ids are dict/set keys everywhere, and interned strings
+        # compare by identity on the fast path
+        self._tx_id = sys.intern(tx_id) if tx_id else None
+        self._fixed_id = bool(tx_id)
+        self._frozen = False  # Set by finalize()
+        # Tuples, read through the properties below and kept in step by the
+        # add_* methods
+        self._inputs = ()  # TxIn of each input
+        self._input_keys = ()  # (prev_tx, index) of each input
+        self._input_ids = ()  # outpoint_id() of each input
+        self._outputs = ()  # TxOut of each output
+        # Kept up to date by add_output, so validation needn't walk the outputs
+        self.total_output = 0
+        self.has_negative_output = False
     
-    @staticmethod
-    def generate_tx_id():
-        """Generate a unique transaction ID"""
-        timestamp = int(time.time() * 1000)  # milliseconds
-        random_suffix = random.randint(1000, 9999)
-        return f"tx_{timestamp}_{random_suffix}"
+    @property
+    def inputs(self):
+        """
+        Inputs as a tuple of TxIn.
+        
+        Read-only, like the TxIns in it: add_input/add_inputs are the only
+        way to change them, so input_keys and input_ids stay in step.
+        """
+        return self._inputs
+    
+    @property
+    def input_keys(self):
+        """(prev_tx, index) of each input, as a tuple"""
+        return self._input_keys
+    
+    @property
+    def input_ids(self):
+        """outpoint_id() of each input, as a tuple"""
+        return self._input_ids
+    
+    @property
+    def outputs(self):
+        """
+        Outputs as a tuple of TxOut.
+        
+        Read-only, like the TxOuts in it: add_output is the only way to
+        change them, so total_output and has_negative_output can't go stale.
+        """
+        return self._outputs
+    
+    @property
+    def tx_id(self):
+        """
+        Transaction ID.
+        
+        Unless one was given explicitly, this is a hash of the inputs and
+        outputs, worked out on first access: equal transactions get equal ids,
+        and no clock or RNG is involved. Adding an input or output resets it,
+        so read it only once the transaction is complete (see finalize).
+        """
+        if self._tx_id is None:
+            digest = hashlib.blake2b(self.canonical_bytes(), digest_size=16).hexdigest()
+            self._tx_id = sys.intern(digest)
+        return self._tx_id
+    
+    def canonical_bytes(self) -> bytes:
+        """
+        Serialize inputs and outputs to the bytes the tx id is hashed from.
+        
+        Counts, fixed-width ints and length-prefixed UTF-8 strings, packed with
+        struct: unambiguous, and much cheaper than sorted-key JSON.
+        """
+        parts = [struct.pack("<II", len(self.inputs), len(self.outputs))]
+        for inp in self.inputs:
+            prev_tx = inp.prev_tx.encode()
+            owner = inp.owner.encode()
+            parts.append(struct.pack(f"<I{len(prev_tx)}sII{len(owner)}s",
+                                     len(prev_tx), prev_tx, inp.index, len(owner), owner))
+        for out in self.outputs:
+            address = out.address.encode()
+            parts.append(struct.pack(f"<qI{len(address)}s", out.amount, len(address), address))
+        return b"".join(parts)
     
     def add_input(self, prev_tx: str, index: int, owner: str):
         """
@@ -32,27 +161,80 @@ class Transaction:
             prev_tx: Previous transaction ID
             index: Output index in previous transaction
             owner: Owner of this UTXO
+            
+        Raises:
+            ValueError: If index is outside 0 to MAX_OUTPUT_INDEX
         """
-        input_data = {
-            "prev_tx": prev_tx,
-            "index": index,
-            "owner": owner
-        }
-        self.inputs.append(input_data)
+        self._check_mutable()
+        prev_tx = sys.intern(prev_tx)
+        input_id = outpoint_id(prev_tx, index)  # validates index before anything is added
+        self._inputs += (TxIn(prev_tx, index, sys.intern(owner)),)
+        self._input_keys += ((prev_tx, index),)
+        self._input_ids += (input_id,)
+        if not self._fixed_id:
+            self._tx_id = None
     
-    def add_output(self, amount: float, address: str):
+    def add_inputs(self, inputs):
+        """
+        Add several inputs at once.
+        
+        Each of the parallel tuples is rebuilt once rather than input by
+        input.
+        
+        Args:
+            inputs: Iterable of (prev_tx, index, owner)
+            
+        Raises:
+            ValueError: If an index is outside 0 to MAX_OUTPUT_INDEX; no
+                input is added in that case
+        """
+        self._check_mutable()
+        new_inputs = tuple(TxIn(sys.intern(prev_tx), index, sys.intern(owner))
+                           for prev_tx, index, owner in inputs)
+        new_keys = tuple((inp.prev_tx, inp.index) for inp in new_inputs)
+        new_ids = tuple(outpoint_id(*key) for key in new_keys)
+        self._inputs += new_inputs
+        self._input_keys += new_keys
+        self._input_ids += new_ids
+        if not self._fixed_id:
+            self._tx_id = None
+    
+    def add_output(self, amount: int, address: str):
         """
         Add an output to the transaction.
         
         Args:
-            amount: Amount in BTC
+            amount: Amount in satoshis
             address: Recipient address
         """
-        output_data = {
-            "amount": amount,
-            "address": address
-        }
-        self.outputs.append(output_data)
+        self._check_mutable()
+        self._outputs += (TxOut(amount, sys.intern(address)),)
+        self.total_output += amount
+        if amount < 0:
+            self.has_negative_output = True
+        if not self._fixed_id:
+            self._tx_id = None
+    
+    def finalize(self):
+        """
+        Freeze the transaction: fix its id and refuse further inputs/outputs.
+        
+        Called by the mempool on admission, so the id it is filed under can't
+        drift afterwards. Adding inputs or outputs to a finalized transaction
+        raises ValueError.
+        
+        Returns:
+            The transaction itself
+        """
+        if not self._frozen:
+            self._tx_id = self.tx_id
+            self._fixed_id = True
+            self._frozen = True
+        return self
+    
+    def _check_mutable(self):
+        if self._frozen:
+            raise ValueError(f"Transaction {self._tx_id} is finalized and can't be modified")
     
     def calculate_fee(self, utxo_manager):
         """
@@ -63,41 +245,45 @@ class Transaction:
             utxo_manager: UTXO manager to look up input values
             
         Returns:
-            Fee amount in BTC
+            Fee amount in satoshis
         """
-        total_input = 0.0
-        for inp in self.inputs:
-            utxo = utxo_manager.get_utxo(inp["prev_tx"], inp["index"])
-            if utxo:
-                total_input += utxo["amount"]
+        try:
+            total_input = sum(utxo_manager.get_amounts(self.input_keys))
+        except KeyError:
+            # Missing inputs count as zero
+            total_input = sum(utxo["amount"] for utxo in utxo_manager.get_many(self.input_keys) if utxo)
         
-        total_output = sum(out["amount"] for out in self.outputs)
-        return total_input - total_output
+        return total_input - self.total_output
     
     def to_dict(self):
         """Convert transaction to dictionary format"""
         return {
             "tx_id": self.tx_id,
-            "inputs": self.inputs,
-            "outputs": self.outputs
+            "inputs": [inp.to_dict() for inp in self.inputs],
+            "outputs": [out.to_dict() for out in self.outputs]
         }
     
     @classmethod
     def from_dict(cls, tx_dict):
         """Create transaction from dictionary"""
         tx = cls(tx_dict["tx_id"])
-        tx.inputs = tx_dict["inputs"]
-        tx.outputs = tx_dict["outputs"]
+        tx._inputs = tuple(TxIn(sys.intern(inp["prev_tx"]), inp["index"], sys.intern(inp["owner"]))
+                           for inp in tx_dict["inputs"])
+        tx._input_keys = tuple((inp.prev_tx, inp.index) for inp in tx.inputs)
+        tx._input_ids = tuple(outpoint_id(*key) for key in tx.input_keys)
+        tx._outputs = tuple(TxOut(out["amount"], sys.intern(out["address"])) for out in tx_dict["outputs"])
+        tx.total_output = sum(out.amount for out in tx.outputs)
+        tx.has_negative_output = any(out.amount < 0 for out in tx.outputs)
         return tx
     
     def __str__(self):
         """String representation of transaction"""
         inputs_str = "\n    ".join([
-            f"({inp['prev_tx']}, {inp['index']}) owned by {inp['owner']}"
+            f"({inp.prev_tx}, {inp.index}) owned by {inp.owner}"
             for inp in self.inputs
         ])
         outputs_str = "\n    ".join([
-            f"{out['amount']:.8f} BTC -> {out['address']}"
+            f"{format_btc(out.amount)} BTC -> {out.address}"
             for out in self.outputs
         ])
         
@@ -112,50 +298,50 @@ class Transaction:
         print(self)
         if utxo_manager:
             fee = self.calculate_fee(utxo_manager)
-            print(f"  Fee: {fee:.8f} BTC")
+            print(f"  Fee: {format_btc(fee)} BTC")
 
 
-def create_simple_transaction(sender: str, recipient: str, amount: float, 
-                              utxo_manager, fee: float = 0.001):
+DEFAULT_FEE = to_satoshis(0.001)
+
+
+def create_simple_transaction(sender: str, recipient: str, amount: int, 
+                              utxo_manager, fee: int = DEFAULT_FEE):
     """
     Helper function to create a simple transaction.
     
     Args:
         sender: Sender address
         recipient: Recipient address
-        amount: Amount to send in BTC
+        amount: Amount to send in satoshis
         utxo_manager: UTXO manager instance
-        fee: Transaction fee in BTC (default 0.001)
+        fee: Transaction fee in satoshis (default 0.001 BTC)
         
     Returns:
         Transaction object or None if insufficient funds
     """
-    # Get sender's UTXOs
-    sender_utxos = utxo_manager.get_utxos_for_owner(sender)
-    
-    if not sender_utxos:
-        return None
-    
     # Select UTXOs to cover amount + fee
     needed = amount + fee
-    selected_utxos = []
-    total_selected = 0.0
+    if utxo_manager.get_balance(sender) < needed:
+        return None  # Insufficient funds
+    
+    # Largest first, so the fewest inputs are used (a single one whenever
+    # any UTXO covers everything)
+    sender_utxos = utxo_manager.get_utxos_for_owner(sender)
+    sender_utxos.sort(key=lambda utxo: utxo[2], reverse=True)
     
-    for tx_id, index, utxo_amount in sender_utxos:
-        selected_utxos.append((tx_id, index, utxo_amount))
-        total_selected += utxo_amount
+    selected_utxos = []
+    total_selected = 0
+    for utxo in sender_utxos:
+        selected_utxos.append(utxo)
+        total_selected += utxo[2]
         if total_selected >= needed:
             break
     
-    if total_selected < needed:
-        return None  # Insufficient funds
-    
     # Create transaction
     tx = Transaction()
     
     # Add inputs
-    for tx_id, index, _ in selected_utxos:
-        tx.add_input(tx_id, index, sender)
+    tx.add_inputs((tx_id, index, sender) for tx_id, index, _ in selected_utxos)
     
     # Add output to recipient
     tx.add_output(amount, recipient)
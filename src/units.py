@@ -0,0 +1,45 @@
+"""
+Units - Fixed-point amounts
+All amounts are kept as integer satoshis; BTC only appears at the edges
+(user input and printed output)
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+SATOSHIS_PER_BTC = 100_000_000
+
+
+def to_satoshis(btc) -> int:
+    """
+    Convert a BTC amount (float, int or numeric string) to satoshis.
+
+    The conversion is done in decimal, so "0.1" is exactly 10,000,000
+    satoshis rather than whatever 0.1 * 1e8 rounds to in binary floating point.
+
+    Args:
+        btc: Amount in BTC
+
+    Returns:
+        Amount in satoshis, rounded to the nearest satoshi
+
+    Raises:
+        ValueError: If btc is not a finite number
+    """
+    try:
+        value = Decimal(str(btc).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid BTC amount: {btc!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"Invalid BTC amount: {btc!r}")
+    return int((value * SATOSHIS_PER_BTC).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def format_btc(satoshis: int, places: int = 8) -> str:
+    """
+    Format a satoshi amount as a BTC string, e.g. 150000000 -> "1.50000000".
+
+    Args:
+        satoshis: Amount in satoshis
+        places: Number of decimal places
+    """
+    return f"{satoshis / SATOSHIS_PER_BTC:.{places}f}"
@@ -3,26 +3,47 @@ UTXO Manager - Manages the Unspent Transaction Output set
 This is Bitcoin's "database" of spendable coins
 """
 
+import sys
+from collections import defaultdict
+
+from units import format_btc
+
+
 class UTXOManager:
     def __init__(self):
         """Initialize UTXO set as dictionary: (tx_id, index) -> (amount, owner)"""
         self.utxo_set = {}
+        # owner -> {(tx_id, index): None}; an insertion-ordered set of the
+        # owner's UTXO keys
+        self.by_owner = defaultdict(dict)
+        # owner -> running total in satoshis; exact since amounts are ints
+        self.balances = defaultdict(int)
+        # Sum of all amounts in the set, kept in step by _put/_delete
+        self._total_supply = 0
+        # Undo log of (key, previous value or None), only kept while a
+        # snapshot is open
+        self._journal = None
     
-    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str):
+    def add_utxo(self, tx_id: str, index: int, amount: int, owner: str):
         """
         Add a new UTXO to the set.
         
         Args:
             tx_id: Transaction ID that created this UTXO
             index: Output index in that transaction
-            amount: Amount in BTC
+            amount: Amount in satoshis
             owner: Address that owns this UTXO
         """
         key = (tx_id, index)
-        self.utxo_set[key] = {
+        previous = self._delete(key)
+        if self._journal is not None:
+            self._journal.append((key, previous))
+        # Interned: a handful of owners recur across every UTXO, so they
+        # share one string object (and compare by identity)
+        self._put(key, {
             "amount": amount,
-            "owner": owner
-        }
+            "owner": sys.intern(owner)
+        })
     
     def remove_utxo(self, tx_id: str, index: int):
         """
@@ -36,30 +57,82 @@ class UTXOManager:
             Removed UTXO data or None if not found
         """
         key = (tx_id, index)
-        if key in self.utxo_set:
-            return self.utxo_set.pop(key)
-        return None
+        removed = self._delete(key)
+        if removed is not None and self._journal is not None:
+            self._journal.append((key, removed))
+        return removed
+    
+    def _put(self, key, utxo_data):
+        """Store a UTXO under a key that is not in the set, updating the owner index"""
+        self.utxo_set[key] = utxo_data
+        self.by_owner[utxo_data["owner"]][key] = None
+        self.balances[utxo_data["owner"]] += utxo_data["amount"]
+        self._total_supply += utxo_data["amount"]
+    
+    def _delete(self, key):
+        """Drop a UTXO and its owner index entry; returns its data or None"""
+        utxo_data = self.utxo_set.pop(key, None)
+        if utxo_data is not None:
+            owner = utxo_data["owner"]
+            owned = self.by_owner[owner]
+            del owned[key]
+            if owned:
+                self.balances[owner] -= utxo_data["amount"]
+            else:
+                del self.by_owner[owner]
+                del self.balances[owner]
+            self._total_supply -= utxo_data["amount"]
+        return utxo_data
+    
+    def begin_snapshot(self):
+        """
+        Start recording changes so they can be undone with rollback().
+        
+        Snapshots nest; each one costs O(1) to take, and rolling back
+        costs O(changes made since), not O(size of the UTXO set).
+        
+        Returns:
+            Token to pass to rollback()
+        """
+        if self._journal is None:
+            self._journal = []
+        return len(self._journal)
+    
+    def rollback(self, token):
+        """
+        Undo every change made since begin_snapshot() returned token.
+        
+        Args:
+            token: Value returned by begin_snapshot()
+        """
+        journal = self._journal
+        for key, previous in reversed(journal[token:]):
+            self._delete(key)
+            if previous is not None:
+                self._put(key, previous)
+        del journal[token:]
+        if token == 0:
+            self._journal = None
     
-    def get_balance(self, owner: str) -> float:
+    def get_balance(self, owner: str) -> int:
         """
-        Calculate total balance for an address.
+        Get total balance for an address, kept up to date on add/remove.
         
         Args:
             owner: Address to check balance for
             
         Returns:
-            Total balance in BTC
+            Total balance in satoshis
         """
-        balance = 0.0
-        for utxo_data in self.utxo_set.values():
-            if utxo_data["owner"] == owner:
-                balance += utxo_data["amount"]
-        return balance
+        return self.balances.get(owner, 0)
     
     def exists(self, tx_id: str, index: int) -> bool:
         """
         Check if UTXO exists and is unspent.
         
+        When the UTXO's data is needed as well, call get_utxo() and test for
+        None instead: one lookup rather than two.
+        
         Args:
             tx_id: Transaction ID
             index: Output index
@@ -80,11 +153,11 @@ class UTXOManager:
         Returns:
             List of tuples: [(tx_id, index, amount), ...]
         """
-        utxos = []
-        for (tx_id, index), utxo_data in self.utxo_set.items():
-            if utxo_data["owner"] == owner:
-                utxos.append((tx_id, index, utxo_data["amount"]))
-        return utxos
+        utxo_set = self.utxo_set
+        return [
+            (tx_id, index, utxo_set[(tx_id, index)]["amount"])
+            for tx_id, index in self.by_owner.get(owner, ())
+        ]
     
     def get_utxo(self, tx_id: str, index: int):
         """
@@ -100,6 +173,32 @@ class UTXOManager:
         key = (tx_id, index)
         return self.utxo_set.get(key)
     
+    def get_amounts(self, keys) -> list:
+        """
+        Get the amounts of several UTXOs in one call.
+        
+        Args:
+            keys: Iterable of (tx_id, index) tuples, all of which must exist
+            
+        Returns:
+            List of amounts in the same order as keys
+        """
+        utxo_set = self.utxo_set
+        return [utxo_set[key]["amount"] for key in keys]
+    
+    def get_many(self, keys) -> list:
+        """
+        Get the data of several UTXOs in one call.
+        
+        Args:
+            keys: Iterable of (tx_id, index) tuples
+            
+        Returns:
+            List of UTXO data dicts (None where not found) in the same order as keys
+        """
+        utxo_set = self.utxo_set
+        return [utxo_set.get(key) for key in keys]
+    
     def display_utxos(self):
         """Display all UTXOs in a readable format"""
         if not self.utxo_set:
@@ -107,21 +206,13 @@ class UTXOManager:
             return
         
         print("\n=== Current UTXO Set ===")
-        # Group by owner
-        owner_utxos = {}
-        for (tx_id, index), utxo_data in self.utxo_set.items():
-            owner = utxo_data["owner"]
-            if owner not in owner_utxos:
-                owner_utxos[owner] = []
-            owner_utxos[owner].append((tx_id, index, utxo_data["amount"]))
-        
-        for owner, utxos in sorted(owner_utxos.items()):
-            total = sum(utxo[2] for utxo in utxos)
-            print(f"\n{owner}: {total:.8f} BTC")
-            for tx_id, index, amount in utxos:
-                print(f"  - ({tx_id}, {index}): {amount:.8f} BTC")
+        for owner in sorted(self.by_owner):
+            print(f"\n{owner}: {format_btc(self.balances[owner])} BTC")
+            for tx_id, index in self.by_owner[owner]:
+                amount = self.utxo_set[(tx_id, index)]["amount"]
+                print(f"  - ({tx_id}, {index}): {format_btc(amount)} BTC")
         print()
     
-    def get_total_supply(self) -> float:
-        """Get total BTC in the system"""
-        return sum(utxo["amount"] for utxo in self.utxo_set.values())
\ No newline at end of file
+    def get_total_supply(self) -> int:
+        """Get total satoshis in the system"""
+        return self._total_supply
\ No newline at end of file